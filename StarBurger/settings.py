@@ -93,10 +93,54 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient"
         },
         "KEY_PREFIX": "star",
-        "TIMEOUT": None,
+        "TIMEOUT": 60 * 60 * 24,
     }
 }
 
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodcartapp.renderers.APIJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Queue orders in a Redis stream instead of saving them in the request,
+# run "python manage.py process_order_intake" to save them then
+ORDER_INTAKE_QUEUE = False
+
+# Public API responses are pretty printed only while debugging
+API_JSON_INDENT = 4 if DEBUG else None
+
+# Memoize distances between points in Redis for all workers, not only in process memory
+DISTANCE_CACHE_SHARED = False
+
+# Candidate restaurants of a geocoded order are the nearest ones that can cook it,
+# at most ORDER_CANDIDATES_LIMIT within ORDER_CANDIDATES_RADIUS_KM, None lifts a limit
+ORDER_CANDIDATES_LIMIT = 10
+ORDER_CANDIDATES_RADIUS_KM = None
+
+# Geocoders are asked in turn until one finds the address. Add
+# {'BACKEND': 'foodcartapp.geocoders.GazetteerGeocoder', 'OPTIONS': {'path': ...}} first
+# to answer known addresses locally, or use FixtureGeocoder to run without network.
+# CircuitBreakerGeocoder stops asking Yandex for a while when it times out or fails.
+GEOCODER_BACKENDS = [
+    {
+        'BACKEND': 'foodcartapp.geocoders.CircuitBreakerGeocoder',
+        'OPTIONS': {
+            'name': 'yandex',
+            'backend': {
+                'BACKEND': 'foodcartapp.geocoders.YandexGeocoder',
+                'OPTIONS': {
+                    'apikey': os.getenv('YA_APIKEY'),
+                },
+            },
+            'failure_threshold': 5,
+            'failure_window': 60,
+            'reset_timeout': 30,
+        },
+    },
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
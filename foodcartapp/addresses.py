@@ -0,0 +1,56 @@
+import re
+
+
+# Abbreviations are expanded so "ул. Тверская" and "улица Тверская" share a cache key.
+# Markers that only say what the next word is, like "г." or "д.", are dropped where they
+# cannot be initials: "д." before a house number, "г." before the city, ahead of the street.
+ADDRESS_ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'наб': 'набережная',
+    'ш': 'шоссе',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'мкр': 'микрорайон',
+    'обл': 'область',
+}
+ADDRESS_STREET_WORDS = {
+    'улица', 'проспект', 'проезд', 'переулок', 'площадь', 'бульвар', 'набережная', 'шоссе', 'микрорайон',
+}
+ADDRESS_CITY_MARKERS = {'г', 'город'}
+ADDRESS_HOUSE_MARKERS = {'д', 'дом'}
+
+# hyphenated abbreviations go before punctuation is stripped
+HYPHENATED_ABBREVIATIONS_PATTERN = re.compile(
+    r'(?<!\w)(' + '|'.join(re.escape(word) for word in ADDRESS_ABBREVIATIONS if '-' in word) + r')(?!\w)'
+)
+PUNCTUATION_PATTERN = re.compile(r'[^\w/]+')
+
+
+def normalize_address(address):
+    """
+    Canonical form of an address used as the coordinates cache key and in the gazetteer:
+    "Москва, ул. Тверская 1" and "москва ул тверская, 1" both become "москва улица тверская 1",
+    while "Москва, ул. Д. Ульянова, д. 3" keeps the initial: "москва улица д ульянова 3".
+    """
+    address = address.casefold().replace('ё', 'е')
+    address = HYPHENATED_ABBREVIATIONS_PATTERN.sub(lambda match: ADDRESS_ABBREVIATIONS[match.group(1)], address)
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in PUNCTUATION_PATTERN.sub(' ', address).split()]
+
+    normalized_words = []
+    street_found = False
+    for word, next_word in zip(words, words[1:] + ['']):
+        before_number = next_word[:1].isdigit()
+        if word in ADDRESS_HOUSE_MARKERS and before_number:
+            continue
+        if word in ADDRESS_CITY_MARKERS and not street_found and next_word and not before_number:
+            continue
+        street_found = street_found or word in ADDRESS_STREET_WORDS
+        normalized_words.append(word)
+    return ' '.join(normalized_words)
@@ -4,6 +4,8 @@ from django.utils.html import format_html
 from django.shortcuts import reverse, redirect
 
 from .models import Restaurant, Product, RestaurantMenuItem, ProductCategory, Order, OrderItem
+from .candidates import refresh_order_candidates
+from .geocoding import geocode_in_background
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -28,10 +30,26 @@ class RestaurantAdmin(admin.ModelAdmin):
         'address',
         'contact_phone',
     ]
+    readonly_fields = [
+        'lat',
+        'lon',
+        'geocode_status',
+        'geocoded_at',
+    ]
     inlines = [
         RestaurantMenuItemInline
     ]
 
+    def save_model(self, request, obj, form, change):
+        address_changed = not change or 'address' in form.changed_data
+        if address_changed:
+            # coordinates of the old address must not be used until the new one is geocoded
+            obj.lat = obj.lon = obj.geocoded_at = None
+            obj.geocode_status = 'pending'
+        super().save_model(request, obj, form, change)
+        if address_changed:
+            geocode_in_background(obj)
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -111,10 +129,32 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(Order)
 class ProductAdmin(admin.ModelAdmin):
 
+    readonly_fields = [
+        'total_price',
+        'lat',
+        'lon',
+        'geocode_status',
+        'geocoded_at',
+    ]
     inlines = [
         OrderProductInline
     ]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_total_price()
+        refresh_order_candidates([form.instance.id])
+
+    def save_model(self, request, obj, form, change):
+        address_changed = not change or 'address' in form.changed_data
+        if address_changed:
+            # coordinates of the old address must not be used until the new one is geocoded
+            obj.lat = obj.lon = obj.geocoded_at = None
+            obj.geocode_status = 'pending'
+        super().save_model(request, obj, form, change)
+        if address_changed:
+            geocode_in_background(obj)
+
     def response_change(self, request, obj):
         if 'next' in request.GET:
             return redirect(request.GET['next'])
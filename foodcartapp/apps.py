@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FoodcartappConfig(AppConfig):
     name = 'foodcartapp'
+
+    def ready(self):
+        from foodcartapp import signals  # noqa: F401
@@ -0,0 +1,161 @@
+"""
+Helpers for the query count and latency benchmarks in foodcartapp/tests.py and restaurateur/tests.py.
+
+Run them with "python manage.py test".
+"""
+import hashlib
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from foodcartapp.candidates import refresh_order_candidates
+from foodcartapp.models import Order, OrderItem, Product, ProductCategory, Restaurant, RestaurantMenuItem
+from foodcartapp.tiered_cache import clear_local_caches
+
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'star-burger-benchmark',
+    }
+}
+
+# size name: (restaurants, products, orders)
+DATA_SIZES = {
+    'small': (5, 20, 20),
+    'medium': (30, 200, 100),
+    'large': (100, 300, 300),
+}
+
+MOSCOW_CENTER = (55.75, 37.62)
+
+
+class LocalGeocoder:
+    """Stand-in for the Yandex geocoder: stable coordinates around Moscow derived from the address."""
+
+    def geocode(self, place):
+        digest = hashlib.md5(place.encode()).digest()
+        lat_shift = (digest[0] - 128) / 1000
+        lon_shift = (digest[1] - 128) / 1000
+        return MOSCOW_CENTER[0] + lat_shift, MOSCOW_CENTER[1] + lon_shift
+
+
+BENCHMARK_GEOCODER_BACKENDS = [
+    {'BACKEND': 'foodcartapp.benchmark.LocalGeocoder'},
+]
+
+
+class Measurement:
+    queries = 0
+    wall_time = 0
+    peak_memory = 0
+
+    def __str__(self):
+        return f'{self.queries} queries, {self.wall_time * 1000:.1f} ms, {self.peak_memory / 1024:.0f} KiB peak'
+
+
+@contextmanager
+def measure():
+    measurement = Measurement()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.perf_counter()
+            yield measurement
+            measurement.wall_time = time.perf_counter() - started_at
+        measurement.queries = len(queries)
+        measurement.peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def generate_data(restaurants_count, products_count, orders_count, seed=0):
+    """
+    Fills the database with a synthetic franchise: restaurants around Moscow with coordinates,
+    products sold by most of the restaurants, unprocessed orders of a few products each.
+    Returns the list of created orders.
+    """
+    randomizer = random.Random(seed)
+
+    category = ProductCategory.objects.create(name='Бургеры')
+    restaurants = Restaurant.objects.bulk_create(
+        Restaurant(
+            name=f'Star Burger {number}',
+            address=f'restaurant {number}',
+            lat=MOSCOW_CENTER[0] + randomizer.uniform(-0.2, 0.2),
+            lon=MOSCOW_CENTER[1] + randomizer.uniform(-0.3, 0.3),
+            geocode_status='done',
+        )
+        for number in range(restaurants_count)
+    )
+    Product.objects.bulk_create(
+        Product(name=f'Бургер {number}', category=category, price=Decimal(randomizer.randint(100, 500)), image='burger.jpg')
+        for number in range(products_count)
+    )
+    restaurants = list(Restaurant.objects.all())
+    products = list(Product.objects.all())
+
+    RestaurantMenuItem.objects.bulk_create(
+        RestaurantMenuItem(restaurant=restaurant, product=product, availability=randomizer.random() < 0.95)
+        for product in products
+        for restaurant in randomizer.sample(restaurants, max(1, restaurants_count * 4 // 5))
+    )
+
+    Order.objects.bulk_create(
+        Order(
+            firstname='Иван',
+            lastname=f'Петров {number}',
+            phonenumber='+79001234567',
+            address=f'order {number}',
+            lat=MOSCOW_CENTER[0] + randomizer.uniform(-0.2, 0.2),
+            lon=MOSCOW_CENTER[1] + randomizer.uniform(-0.3, 0.3),
+            geocode_status='done',
+        )
+        for number in range(orders_count)
+    )
+    orders = list(Order.objects.all())
+
+    order_items = []
+    for order in orders:
+        for product in randomizer.sample(products, min(3, len(products))):
+            order_items.append(OrderItem(order=order, product=product, quantity=randomizer.randint(1, 3), price=product.price))
+    OrderItem.objects.bulk_create(order_items)
+
+    refresh_order_candidates([order.id for order in orders])
+    return orders
+
+
+@override_settings(CACHES=BENCHMARK_CACHES, GEOCODER_BACKENDS=BENCHMARK_GEOCODER_BACKENDS)
+class BenchmarkTestCase(TestCase):
+    """
+    Base for benchmarks: an isolated local cache and a local geocoder stand-in.
+    Subclasses check measurements against budgets with assertWithinBudget.
+    """
+
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+
+    @contextmanager
+    def data_of_size(self, size):
+        """Generates DATA_SIZES[size] data and rolls it back afterwards, yields created orders."""
+        with self.subTest(size=size), transaction.atomic():
+            cache.clear()
+            clear_local_caches()
+            yield generate_data(*DATA_SIZES[size])
+            transaction.set_rollback(True)
+
+    def assertWithinBudget(self, measurement, queries=None, wall_time=None, peak_memory=None):
+        if queries is not None:
+            self.assertLessEqual(measurement.queries, queries, f'query budget exceeded: {measurement}')
+        if wall_time is not None:
+            self.assertLessEqual(measurement.wall_time, wall_time, f'time budget exceeded: {measurement}')
+        if peak_memory is not None:
+            self.assertLessEqual(measurement.peak_memory, peak_memory, f'memory budget exceeded: {measurement}')
@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from foodcartapp.distances import get_orders_restaurants_with_distance
+from foodcartapp.models import (Order, OrderCandidateRestaurant, OrderItem, RestaurantMenuItem,
+                                get_orders_restaurants)
+from foodcartapp.spatial import spatial_index
+
+
+def get_orders_candidate_restaurants(orders):
+    """
+    Returns {order.id: [candidate restaurants]}: restaurants that can cook the order, of them only
+    settings.ORDER_CANDIDATES_LIMIT nearest within settings.ORDER_CANDIDATES_RADIUS_KM for a geocoded order.
+    Restaurants without coordinates stay candidates, their distance is unknown.
+    """
+    orders_restaurants = get_orders_restaurants(orders)
+    limit, radius_km = settings.ORDER_CANDIDATES_LIMIT, settings.ORDER_CANDIDATES_RADIUS_KM
+    if limit is None and radius_km is None:
+        return orders_restaurants
+
+    for order in orders:
+        if not order.coordinates:
+            continue
+        restaurants = orders_restaurants[order.id]
+        nearest = spatial_index.nearest(
+            order.coordinates,
+            k=limit,
+            radius_km=radius_km,
+            restaurant_ids=[restaurant.id for restaurant in restaurants if restaurant.coordinates],
+        )
+        nearest_ids = {restaurant_id for restaurant_id, _ in nearest}
+        orders_restaurants[order.id] = [
+            restaurant for restaurant in restaurants
+            if restaurant.id in nearest_ids or not restaurant.coordinates
+        ]
+    return orders_restaurants
+
+
+def refresh_order_candidates(order_ids):
+    """Recomputes OrderCandidateRestaurant rows of the orders from menus and stored coordinates."""
+    with transaction.atomic():
+        # the geocoding thread and a menu change may refresh an order at once, without the lock
+        # both delete the old rows and the second insert breaks the unique (order, restaurant)
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(id__in=order_ids)
+            .order_by('id')
+            .prefetch_related('order_items')
+        )
+        if not orders:
+            return
+        restaurants_with_distance = get_orders_restaurants_with_distance(
+            orders,
+            get_orders_candidate_restaurants(orders),
+        )
+
+        candidates = [
+            OrderCandidateRestaurant(order=order, restaurant=restaurant, distance_km=restaurant_distance)
+            for order in orders
+            for restaurant, restaurant_distance in restaurants_with_distance[order.id]
+        ]
+        OrderCandidateRestaurant.objects.filter(order__in=orders).delete()
+        OrderCandidateRestaurant.objects.bulk_create(candidates)
+
+
+def refresh_restaurant_candidates(restaurant_ids):
+    """
+    Refreshes unprocessed orders the restaurants can cook products of, e.g. after a new address:
+    a restaurant that moved closer may push another one out of the nearest candidates.
+    """
+    product_ids = RestaurantMenuItem.objects.filter(
+        restaurant_id__in=restaurant_ids,
+        availability=True,
+    ).values('product_id')
+    order_ids = OrderItem.objects.filter(
+        product_id__in=product_ids,
+        order__status='unprocessed',
+    ).values_list('order_id', flat=True).distinct()
+    refresh_order_candidates(list(order_ids))
+
+
+def refresh_product_candidates(product_ids):
+    """Refreshes unprocessed orders with the products after menus change."""
+    order_ids = OrderItem.objects.filter(
+        product_id__in=product_ids,
+        order__status='unprocessed',
+    ).values_list('order_id', flat=True).distinct()
+    refresh_order_candidates(list(order_ids))
+
+
+def get_orders_candidates(order_ids):
+    """Returns {order id: [(restaurant name, distance km or None), ...]} sorted by distance with one query."""
+    candidates = OrderCandidateRestaurant.objects.filter(order_id__in=order_ids) \
+        .order_by('order_id', F('distance_km').asc(nulls_last=True)) \
+        .values_list('order_id', 'restaurant__name', 'distance_km')
+
+    orders_candidates = defaultdict(list)
+    for order_id, restaurant_name, restaurant_distance in candidates:
+        orders_candidates[order_id].append((restaurant_name, restaurant_distance))
+    return orders_candidates
@@ -0,0 +1,139 @@
+import threading
+
+from django.core.cache import cache
+
+
+CAPABILITIES_VERSION_KEY = 'restaurant_capabilities_version'
+
+
+class RestaurantCapabilityIndex:
+    """
+    In-memory index of which restaurants can cook a product.
+
+    Every restaurant owns a bit, every product is mapped to a bitset of restaurants
+    having it in the menu with availability=True, so restaurants able to cook a whole
+    order are an AND over a few integers.
+    The index is patched by RestaurantMenuItem signals, see foodcartapp.signals.
+    Other workers notice the change by the version stored in the cache and rebuild lazily.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._restaurant_bits = {}
+        self._bit_restaurants = []
+        self._product_masks = {}
+        self._menu_items = {}
+
+    def _get_restaurant_bit(self, restaurant_id):
+        bit = self._restaurant_bits.get(restaurant_id)
+        if bit is None:
+            bit = len(self._bit_restaurants)
+            self._restaurant_bits[restaurant_id] = bit
+            self._bit_restaurants.append(restaurant_id)
+        return bit
+
+    def _add(self, menu_item_id, restaurant_id, product_id):
+        bit = self._get_restaurant_bit(restaurant_id)
+        self._product_masks[product_id] = self._product_masks.get(product_id, 0) | 1 << bit
+        self._menu_items[menu_item_id] = (restaurant_id, product_id)
+
+    def _discard(self, menu_item_id):
+        if menu_item_id not in self._menu_items:
+            return
+        restaurant_id, product_id = self._menu_items.pop(menu_item_id)
+        mask = self._product_masks.get(product_id, 0) & ~(1 << self._restaurant_bits[restaurant_id])
+        if mask:
+            self._product_masks[product_id] = mask
+        else:
+            self._product_masks.pop(product_id, None)
+
+    def rebuild(self):
+        from foodcartapp.models import RestaurantMenuItem
+
+        with self._lock:
+            version = cache.get_or_set(CAPABILITIES_VERSION_KEY, 0, timeout=None)
+            self._restaurant_bits = {}
+            self._bit_restaurants = []
+            self._product_masks = {}
+            self._menu_items = {}
+
+            menu_items = RestaurantMenuItem.objects.filter(availability=True) \
+                .order_by('restaurant_id') \
+                .values_list('id', 'restaurant_id', 'product_id')
+            for menu_item_id, restaurant_id, product_id in menu_items.iterator():
+                self._add(menu_item_id, restaurant_id, product_id)
+            self._version = version
+
+    def _bump_version(self):
+        try:
+            version = cache.incr(CAPABILITIES_VERSION_KEY)
+        except ValueError:
+            cache.set(CAPABILITIES_VERSION_KEY, 0, timeout=None)
+            version = None
+        # another worker changed menus meanwhile, so our copy misses its changes
+        if self._version is None or version != self._version + 1:
+            self._version = None
+        else:
+            self._version = version
+
+    def update_menu_item(self, menu_item):
+        with self._lock:
+            if self._version is not None:
+                self._discard(menu_item.id)
+                if menu_item.availability:
+                    self._add(menu_item.id, menu_item.restaurant_id, menu_item.product_id)
+            self._bump_version()
+
+    def remove_menu_item(self, menu_item):
+        with self._lock:
+            if self._version is not None:
+                self._discard(menu_item.id)
+            self._bump_version()
+
+    def _ensure_fresh(self):
+        if self._version is None or cache.get(CAPABILITIES_VERSION_KEY) != self._version:
+            self.rebuild()
+
+    def _get_restaurant_ids(self, product_ids):
+        if not product_ids:
+            return []
+
+        mask = -1
+        for product_id in product_ids:
+            mask &= self._product_masks.get(product_id, 0)
+            if not mask:
+                return []
+
+        restaurant_ids = []
+        while mask:
+            lowest_bit = mask & -mask
+            restaurant_ids.append(self._bit_restaurants[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return restaurant_ids
+
+    def get_bulk_candidate_restaurant_ids(self, products_by_key):
+        """
+        Takes {key: product ids} and returns {key: ids of restaurants that can cook every product}.
+        Checks the index version once per call, so prefer it to per-order lookups.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return {key: self._get_restaurant_ids(set(product_ids)) for key, product_ids in products_by_key.items()}
+
+    def get_candidate_restaurant_ids(self, product_ids):
+        return self.get_bulk_candidate_restaurant_ids({None: product_ids})[None]
+
+    def get_availability_matrix(self, product_ids, restaurant_ids):
+        """Returns {product id: [is the product available in the restaurant, ...]} in restaurant_ids order."""
+        with self._lock:
+            self._ensure_fresh()
+            bits = [self._restaurant_bits.get(restaurant_id) for restaurant_id in restaurant_ids]
+            availability_matrix = {}
+            for product_id in product_ids:
+                mask = self._product_masks.get(product_id, 0)
+                availability_matrix[product_id] = [bit is not None and bool(mask >> bit & 1) for bit in bits]
+            return availability_matrix
+
+
+capability_index = RestaurantCapabilityIndex()
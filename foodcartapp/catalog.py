@@ -0,0 +1,101 @@
+import time
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+
+from foodcartapp.renderers import dump_api_json
+from foodcartapp.tiered_cache import catalog_cache
+
+
+CATALOG_VERSION_KEY = 'product_catalog_version'
+CATALOG_PAYLOAD_KEY = 'product_catalog_payload'
+CATALOG_PAYLOAD_TIMEOUT = 60 * 60
+
+
+def get_initial_catalog_version():
+    # versions start from the current time so etags issued before a cache flush never come back
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, get_initial_catalog_version, timeout=None)
+
+
+def get_catalog_etag(version):
+    return f'catalog-{version}'
+
+
+def invalidate_catalog():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, get_initial_catalog_version(), timeout=None)
+    catalog_cache.delete(CATALOG_PAYLOAD_KEY)
+
+
+def get_media_url_builder():
+    # FileSystemStorage.url() boils down to this, without a urljoin per product
+    if isinstance(default_storage, FileSystemStorage):
+        base_url = default_storage.base_url
+        return lambda name: base_url + filepath_to_uri(name)
+    return default_storage.url
+
+
+def dump_products(product_rows):
+    """
+    Takes rows of Product.objects.values(*CATALOG_FIELDS) instead of model instances.
+    Prices go as strings, same as DjangoJSONEncoder renders Decimal.
+    """
+    get_media_url = get_media_url_builder()
+
+    dumped_products = []
+    for product in product_rows:
+        category = None
+        if product['category_id'] is not None:
+            category = {
+                'id': product['category_id'],
+                'name': product['category__name'],
+            }
+        dumped_product = {
+            'id': product['id'],
+            'name': product['name'],
+            'price': str(product['price']),
+            'special_status': product['special_status'],
+            'ingridients': product['ingridients'],
+            'category': category,
+            'image': get_media_url(product['image']),
+            'restaurant': {
+                'id': product['id'],
+                'name': product['name'],
+            }
+        }
+        dumped_products.append(dumped_product)
+    return dumped_products
+
+
+CATALOG_FIELDS = ['id', 'name', 'price', 'special_status', 'ingridients', 'category_id', 'category__name', 'image']
+
+
+def get_catalog_payload(version=None):
+    """
+    Returns (catalog version, serialized product list as bytes).
+    The hot path is a version read, or none when the caller has read the version already,
+    plus the payload from the process memory. The payload is rebuilt after invalidate_catalog().
+    """
+    from foodcartapp.models import Product
+
+    if version is None:
+        version = get_catalog_version()
+    # the local copy may outlive a flush of the shared cache, the version tells
+    cached_payload = catalog_cache.get(CATALOG_PAYLOAD_KEY)
+    if cached_payload and cached_payload[0] == version:
+        return cached_payload
+
+    product_rows = Product.objects.available().values(*CATALOG_FIELDS)
+    payload = dump_api_json(dump_products(product_rows))
+
+    # the catalog could change while we were serializing it, the next request rebuilds it then
+    if cache.get(CATALOG_VERSION_KEY) == version:
+        catalog_cache.set(CATALOG_PAYLOAD_KEY, (version, payload), timeout=CATALOG_PAYLOAD_TIMEOUT)
+    return version, payload
@@ -0,0 +1,133 @@
+"""
+Cache of geocoded coordinates in front of the geocoders.
+
+Found coordinates stay fresh for COORDINATES_TTL and are served stale for COORDINATES_STALE_TTL
+more while one worker refreshes them in the background. Addresses the geocoders did not find are
+cached as None for COORDINATES_NEGATIVE_TTL, so a bad address costs one geocoder call per window.
+Timeouts and other unavailability are not cached, foodcartapp.geocoders.CircuitBreakerGeocoder
+keeps a failing geocoder from being asked again and again.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from foodcartapp.addresses import normalize_address
+from foodcartapp.metrics import increment
+from foodcartapp.tiered_cache import coordinates_cache
+from foodcartapp.utils import fetch_bulk_coordinates
+
+
+COORDINATES_TTL = 60 * 60 * 24 * 30
+COORDINATES_STALE_TTL = 60 * 60 * 24 * 7
+COORDINATES_NEGATIVE_TTL = 60 * 15
+COORDINATES_REFRESH_LOCK_TIMEOUT = 60
+
+
+def get_coordinates_cache_key(address):
+    return f'geocode:{normalize_address(address)}'
+
+
+def get_coordinates_entry(address, coordinates, now):
+    """
+    (cache entry, timeout) for coordinates or None, None marks an address that failed to geocode.
+    The entry keeps the spelling of the address it was geocoded for, to count lookups of other spellings.
+    """
+    if coordinates:
+        return (coordinates, now + COORDINATES_TTL, address), COORDINATES_TTL + COORDINATES_STALE_TTL
+    return (None, now + COORDINATES_NEGATIVE_TTL, address), COORDINATES_NEGATIVE_TTL
+
+
+def store_coordinates(addresses_coordinates, now=None):
+    """Caches {cache key: (address, coordinates or None)} with a single write."""
+    now = now or time.time()
+    coordinates_cache.set_many_with_timeouts({
+        key: get_coordinates_entry(address, coordinates, now)
+        for key, (address, coordinates) in addresses_coordinates.items()
+    })
+
+
+def refresh_coordinates(stale_entries):
+    """Geocodes stale {cache key: (address, coordinates)} again, keeps the old coordinates if that fails."""
+    stale_entries = {
+        key: entry for key, entry in stale_entries.items()
+        if cache.add(f'{key}:refresh', 1, timeout=COORDINATES_REFRESH_LOCK_TIMEOUT)
+    }
+    if not stale_entries:
+        return
+    fetched_coordinates = fetch_bulk_coordinates(address for address, _ in stale_entries.values())
+
+    now = time.time()
+    entries = {}
+    for key, (address, coordinates) in stale_entries.items():
+        if fetched_coordinates.get(address):
+            entries[key] = get_coordinates_entry(address, fetched_coordinates[address], now)
+        else:
+            # the geocoder may be down, try again in a while instead of on every lookup
+            entry = (coordinates, now + COORDINATES_NEGATIVE_TTL, address)
+            entries[key] = entry, COORDINATES_NEGATIVE_TTL + COORDINATES_STALE_TTL
+    coordinates_cache.set_many_with_timeouts(entries)
+    cache.delete_many([f'{key}:refresh' for key in stale_entries])
+
+
+def refresh_coordinates_in_background(stale_entries):
+    increment('geocode.stale', len(stale_entries))
+    threading.Thread(target=refresh_coordinates, args=(stale_entries,), daemon=True).start()
+
+
+def get_bulk_cached_coordinates(addresses, geocode_misses=True):
+    """
+    Returns {address: (lat, lon) or None}, None for addresses the geocoders did not find.
+    Addresses the geocoders could not be asked about, e.g. while the circuit is open, are left out,
+    so are addresses missing in the cache when geocode_misses is False.
+    Spellings of the same address share a cache entry and a geocoder call. The "geocode.deduped"
+    counter shows how many lookups that saved: lookups answered by an entry geocoded for another
+    spelling, in this call or an earlier one.
+    """
+    cache_keys = {address.strip(): get_coordinates_cache_key(address) for address in addresses}
+    increment('geocode.lookups', len(cache_keys))
+
+    entries = coordinates_cache.get_many(set(cache_keys.values()))
+
+    now = time.time()
+    coordinates = {}
+    missed_addresses = {}
+    stale_entries = {}
+    deduped_count = 0
+    for address, cache_key in cache_keys.items():
+        if cache_key not in entries:
+            if missed_addresses.setdefault(cache_key, address) != address:
+                deduped_count += 1
+            continue
+        cached_coordinates, fresh_until, cached_address = entries[cache_key]
+        if cached_address != address:
+            deduped_count += 1
+        coordinates[cache_key] = cached_coordinates
+        if cached_coordinates and fresh_until < now:
+            stale_entries[cache_key] = (address, cached_coordinates)
+    increment('geocode.deduped', deduped_count)
+
+    if not geocode_misses:
+        missed_addresses = {}
+    increment('geocode.misses', len(missed_addresses))
+    fetched_coordinates = fetch_bulk_coordinates(missed_addresses.values())
+    fetched_coordinates = {
+        cache_key: fetched_coordinates[address]
+        for cache_key, address in missed_addresses.items()
+        if address in fetched_coordinates
+    }
+    if fetched_coordinates:
+        store_coordinates({
+            cache_key: (missed_addresses[cache_key], cache_coordinates)
+            for cache_key, cache_coordinates in fetched_coordinates.items()
+        })
+    if stale_entries:
+        refresh_coordinates_in_background(stale_entries)
+
+    coordinates.update(fetched_coordinates)
+    return {address: coordinates[cache_key] for address, cache_key in cache_keys.items() if cache_key in coordinates}
+
+
+def get_cached_coordinates(address):
+    """(lat, lon) of the address or None if it was not found or the geocoders are unavailable."""
+    return get_bulk_cached_coordinates([address]).get(address.strip())
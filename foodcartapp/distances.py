@@ -0,0 +1,112 @@
+import numpy as np
+from django.conf import settings
+
+from foodcartapp.metrics import increment
+from foodcartapp.tiered_cache import LocalCache, distances_cache
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# memo keys round coordinates to 5 decimal places, about a meter
+DISTANCE_MEMO_PRECISION = 5
+DISTANCE_MEMO_SIZE = 100000
+DISTANCE_MEMO_TIMEOUT = 24 * 60 * 60
+
+local_distances_cache = LocalCache(DISTANCE_MEMO_SIZE, DISTANCE_MEMO_TIMEOUT)
+
+
+def _to_radians(coordinates):
+    points = np.array(
+        [point if point else (np.nan, np.nan) for point in coordinates],
+        dtype=float,
+    ).reshape(-1, 2)
+    return np.radians(points)
+
+
+def get_pairwise_distances(origins, destinations):
+    """Haversine distances in km between origins[i] and destinations[i]."""
+    origins = _to_radians(origins)
+    destinations = _to_radians(destinations)
+    return _haversine(origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1])
+
+
+def _haversine(origins_lat, origins_lon, destinations_lat, destinations_lon):
+    haversine = (
+        np.sin((destinations_lat - origins_lat) / 2) ** 2
+        + np.cos(origins_lat) * np.cos(destinations_lat) * np.sin((destinations_lon - origins_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
+
+
+def get_distance_memo_key(origin, destination):
+    # the distance is symmetric, so both directions share a key
+    origin, destination = sorted([
+        (round(origin[0], DISTANCE_MEMO_PRECISION), round(origin[1], DISTANCE_MEMO_PRECISION)),
+        (round(destination[0], DISTANCE_MEMO_PRECISION), round(destination[1], DISTANCE_MEMO_PRECISION)),
+    ])
+    return f'distance:{origin[0]},{origin[1]}:{destination[0]},{destination[1]}'
+
+
+def get_memoized_distances(pairs):
+    """
+    Distances in km rounded to 10 m between (origin, destination) pairs of known points, in order.
+    Distances are memoized in the process, or in Redis too with settings.DISTANCE_CACHE_SHARED.
+    Hits and misses are counted as "distances.hits" and "distances.misses".
+    """
+    memo = distances_cache if settings.DISTANCE_CACHE_SHARED else local_distances_cache
+    keys = [get_distance_memo_key(origin, destination) for origin, destination in pairs]
+    distances = memo.get_many(keys)
+
+    missed_pairs = {}
+    for key, pair in zip(keys, pairs):
+        if key not in distances:
+            missed_pairs.setdefault(key, pair)
+    increment('distances.hits', len(keys) - len(missed_pairs))
+    increment('distances.misses', len(missed_pairs))
+
+    if missed_pairs:
+        computed_distances = get_pairwise_distances(
+            [origin for origin, _ in missed_pairs.values()],
+            [destination for _, destination in missed_pairs.values()],
+        )
+        computed_distances = {
+            key: round(float(pair_distance), 2)
+            for key, pair_distance in zip(missed_pairs, computed_distances)
+        }
+        memo.set_many(computed_distances, timeout=DISTANCE_MEMO_TIMEOUT)
+        distances.update(computed_distances)
+    return [distances[key] for key in keys]
+
+
+def sort_by_distance(restaurants_with_distance):
+    return sorted(restaurants_with_distance, key=lambda restaurant: (restaurant[1] is None, restaurant[1] or 0))
+
+
+def get_orders_restaurants_with_distance(orders, orders_restaurants):
+    """
+    Takes orders and {order.id: [candidate restaurants]}, see foodcartapp.models.get_orders_restaurants.
+    Returns {order.id: [(restaurant, distance km or None), ...]} sorted by distance,
+    distances of the whole batch of orders are looked up in the memo at once.
+    """
+    orders = list(orders)
+    known_pairs = [
+        (order, restaurant)
+        for order in orders
+        for restaurant in orders_restaurants[order.id]
+        if order.coordinates and restaurant.coordinates
+    ]
+    distances = get_memoized_distances([
+        (order.coordinates, restaurant.coordinates) for order, restaurant in known_pairs
+    ])
+    pairs_distances = {
+        (order.id, restaurant.id): pair_distance
+        for (order, restaurant), pair_distance in zip(known_pairs, distances)
+    }
+
+    return {
+        order.id: sort_by_distance([
+            (restaurant, pairs_distances.get((order.id, restaurant.id)))
+            for restaurant in orders_restaurants[order.id]
+        ])
+        for order in orders
+    }
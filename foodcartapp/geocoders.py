@@ -0,0 +1,242 @@
+import json
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from foodcartapp.addresses import normalize_address
+
+
+GEOCODER_TIMEOUT = (3.05, 10)
+GEOCODER_RETRIES = 2
+GEOCODER_POOL_SIZE = 10
+GEOCODER_ERRORS = (requests.RequestException, LookupError, ValueError)
+# the geocoder could not be asked, unlike LookupError it says nothing about the address
+GEOCODER_UNAVAILABLE_ERRORS = (requests.RequestException,)
+
+
+class GeocoderUnavailable(requests.RequestException):
+    pass
+
+
+def make_geocoder_session():
+    retry = Retry(total=GEOCODER_RETRIES, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=GEOCODER_POOL_SIZE)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+class YandexGeocoder:
+    """Geocodes with the Yandex HTTP API over one keep-alive session."""
+
+    base_url = "https://geocode-maps.yandex.ru/1.x"
+
+    def __init__(self, apikey=None):
+        self.apikey = apikey or os.getenv("YA_APIKEY")
+        self.session = make_geocoder_session()
+
+    def geocode(self, place):
+        params = {"geocode": place, "apikey": self.apikey, "format": "json"}
+        response = self.session.get(self.base_url, params=params, timeout=GEOCODER_TIMEOUT)
+        response.raise_for_status()
+        places_found = response.json()['response']['GeoObjectCollection']['featureMember']
+        most_relevant = places_found[0]
+        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+        return float(lat), float(lon)
+
+
+class GazetteerGeocoder:
+    """
+    Answers from a local SQLite table of normalized addresses, without network.
+
+    An exact match wins, otherwise the shortest address starting with the words of the place
+    is taken, so "москва, тверская 1" finds "москва, тверская 1, стр. 2" but not "москва, тверская 12".
+    Addresses are compared in the foodcartapp.addresses.normalize_address form.
+    Fill it with the load_gazetteer management command.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path)
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS gazetteer (address TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL)'
+            )
+        return connection
+
+    def geocode(self, place):
+        address = normalize_address(place)
+        if not address:
+            raise LookupError(place)
+
+        row = self.connection.execute('SELECT lat, lon FROM gazetteer WHERE address = ?', [address]).fetchone()
+        if row is None:
+            # whole words only, so "тверская 1" does not find "тверская 12";
+            # a range over the primary key index, unlike LIKE it does not depend on collation
+            prefix = address + ' '
+            row = self.connection.execute(
+                'SELECT lat, lon FROM gazetteer WHERE address >= ? AND address < ? ORDER BY length(address) LIMIT 1',
+                [prefix, prefix + '\U0010ffff'],
+            ).fetchone()
+        if row is None:
+            raise LookupError(place)
+        return row
+
+    def add_many(self, addresses_coordinates):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO gazetteer (address, lat, lon) VALUES (?, ?, ?)',
+                [(normalize_address(address), lat, lon) for address, (lat, lon) in addresses_coordinates],
+            )
+
+
+class FixtureGeocoder:
+    """
+    Replays answers recorded in a JSON file, for load tests and CI without network.
+
+    With record=True places missing in the file are geocoded by the backend built
+    from the record_from settings dict and saved to the file.
+    Places recorded as not found are replayed as not found.
+    """
+
+    def __init__(self, path, record=False, record_from=None):
+        self.path = path
+        self.record = record
+        self.record_from = load_geocoder(record_from) if record else None
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as fixture:
+                self.answers = json.load(fixture)
+        except FileNotFoundError:
+            self.answers = {}
+
+    def geocode(self, place):
+        if place not in self.answers:
+            if not self.record:
+                raise LookupError(place)
+            self._record(place)
+        coordinates = self.answers[place]
+        if coordinates is None:
+            raise LookupError(place)
+        return tuple(coordinates)
+
+    def _record(self, place):
+        try:
+            coordinates = self.record_from.geocode(place)
+        except LookupError:
+            coordinates = None
+        with self._lock:
+            self.answers[place] = coordinates
+            with open(self.path, 'w', encoding='utf-8') as fixture:
+                json.dump(self.answers, fixture, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+class ChainGeocoder:
+    """Asks backends in turn and returns the first answer."""
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def geocode(self, place):
+        error = LookupError(place)
+        for backend in self.backends:
+            try:
+                return backend.geocode(place)
+            except GEOCODER_ERRORS as backend_error:
+                error = backend_error
+        raise error
+
+
+class CircuitBreakerGeocoder:
+    """
+    Stops asking a failing backend for reset_timeout seconds after failure_threshold timeouts
+    or connection errors within failure_window seconds, then lets a single probe through.
+    A successful probe closes the circuit, a failed one opens it again. The state is kept
+    in the default cache, so all workers open and close the circuit together.
+    """
+
+    def __init__(self, name, backend, failure_threshold=5, failure_window=60, reset_timeout=30):
+        self.backend = load_geocoder(backend)
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self.failures_key = f'geocoder_circuit:{name}:failures'
+        self.open_key = f'geocoder_circuit:{name}:open'
+        self.tripped_key = f'geocoder_circuit:{name}:tripped'
+        self.probe_key = f'geocoder_circuit:{name}:probe'
+
+    def geocode(self, place):
+        state = cache.get_many([self.open_key, self.tripped_key])
+        if self.open_key in state:
+            raise GeocoderUnavailable(place)
+        probing = self.tripped_key in state
+        # half-open: one worker probes the backend, the others keep failing fast
+        if probing and not cache.add(self.probe_key, 1, timeout=self.reset_timeout):
+            raise GeocoderUnavailable(place)
+
+        try:
+            coordinates = self.backend.geocode(place)
+        except GEOCODER_UNAVAILABLE_ERRORS:
+            self.record_failure(probing)
+            raise
+        except GEOCODER_ERRORS:
+            # the address was not found, but the backend answered
+            if probing:
+                self.close()
+            raise
+        if probing:
+            self.close()
+        return coordinates
+
+    def record_failure(self, probing):
+        if probing:
+            self.open()
+            return
+        cache.add(self.failures_key, 0, timeout=self.failure_window)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            failures = 1
+            cache.set(self.failures_key, failures, timeout=self.failure_window)
+        if failures >= self.failure_threshold:
+            self.open()
+
+    def open(self):
+        cache.set(self.open_key, 1, timeout=self.reset_timeout)
+        cache.set(self.tripped_key, 1, timeout=None)
+        cache.delete_many([self.failures_key, self.probe_key])
+
+    def close(self):
+        cache.delete_many([self.tripped_key, self.failures_key, self.probe_key])
+
+
+def load_geocoder(backend_settings):
+    backend_class = import_string(backend_settings['BACKEND'])
+    return backend_class(**backend_settings.get('OPTIONS', {}))
+
+
+@lru_cache()
+def get_geocoder():
+    """Geocoder built from settings.GEOCODER_BACKENDS, backends are asked in the listed order."""
+    return ChainGeocoder([load_geocoder(backend_settings) for backend_settings in settings.GEOCODER_BACKENDS])
+
+
+@receiver(setting_changed)
+def reset_geocoder(setting, **kwargs):
+    if setting == 'GEOCODER_BACKENDS':
+        get_geocoder.cache_clear()
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from foodcartapp.candidates import refresh_order_candidates, refresh_restaurant_candidates
+from foodcartapp.coordinates import get_bulk_cached_coordinates
+from foodcartapp.models import Restaurant
+from foodcartapp.spatial import spatial_index
+
+
+# a spike of orders queues geocoding tasks here instead of opening a connection per order,
+# the executor finishes queued tasks before the process exits
+GEOCODING_WORKERS = 4
+
+geocoding_executor = ThreadPoolExecutor(max_workers=GEOCODING_WORKERS, thread_name_prefix='geocoding')
+
+
+def geocode_places(model, pks):
+    places = list(model.objects.filter(pk__in=pks).only('address'))
+    addresses = [place.address.strip() for place in places if place.address.strip()]
+    coordinates = get_bulk_cached_coordinates(addresses) if addresses else {}
+
+    geocoded_at = timezone.now()
+    for place in places:
+        if place.address.strip() and place.address.strip() not in coordinates:
+            # the geocoder is unavailable, the place stays pending until it is geocoded again
+            continue
+        place_coordinates = coordinates.get(place.address.strip())
+        lat, lon = place_coordinates or (None, None)
+        # the address may have been edited while we were geocoding, the newer task wins then
+        model.objects.filter(pk=place.pk, address=place.address).update(
+            lat=lat,
+            lon=lon,
+            geocode_status='done' if place_coordinates else 'failed',
+            geocoded_at=geocoded_at,
+        )
+    if model is Restaurant:
+        spatial_index.invalidate()
+        refresh_restaurant_candidates(pks)
+    else:
+        refresh_order_candidates(pks)
+
+
+def _geocode_places_in_thread(model, pks):
+    try:
+        geocode_places(model, pks)
+    finally:
+        connection.close()
+
+
+def submit_geocoding(model, pks):
+    """Geocode the places in a thread of geocoding_executor, returns its future."""
+    return geocoding_executor.submit(_geocode_places_in_thread, model, pks)
+
+
+def geocode_in_background(*places):
+    """Schedule geocoding of the places addresses after the current transaction commits."""
+    if not places:
+        return
+    model, pks = type(places[0]), [place.pk for place in places]
+    transaction.on_commit(lambda: submit_geocoding(model, pks))
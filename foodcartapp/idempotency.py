@@ -0,0 +1,96 @@
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_LOCK_WAIT = 10
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+
+
+def get_request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay_response(stored_response, fingerprint):
+    if stored_response['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': 'Ключ идемпотентности уже использован с другими данными.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored_response['data'], status=stored_response['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(scope):
+    """
+    Makes a DRF view honour the Idempotency-Key header.
+
+    Successful responses are stored in the cache for IDEMPOTENCY_TTL, a retry with the
+    same key gets the stored response without running the view. Concurrent requests
+    with the same key wait for the first one under a lock kept in the cache.
+    Requests without the header run the view as usual.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            idempotency_key = request.META.get(IDEMPOTENCY_HEADER)
+            if not idempotency_key:
+                return view(request, *args, **kwargs)
+            if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return Response(
+                    {'detail': f'Ключ идемпотентности длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} символов.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            key_hash = hashlib.sha256(idempotency_key.encode()).hexdigest()
+            response_key = f'idempotency:{scope}:{key_hash}'
+            lock_key = f'{response_key}:lock'
+            fingerprint = get_request_fingerprint(request)
+            # retries carry the same fingerprint, the lock is told apart by a token of this request
+            lock_token = uuid.uuid4().hex
+
+            deadline = time.monotonic() + IDEMPOTENCY_LOCK_WAIT
+            while True:
+                stored_response = cache.get(response_key)
+                if stored_response:
+                    return replay_response(stored_response, fingerprint)
+                if cache.add(lock_key, lock_token, timeout=IDEMPOTENCY_LOCK_TIMEOUT):
+                    break
+                if time.monotonic() > deadline:
+                    return Response(
+                        {'detail': 'Запрос с этим ключом идемпотентности ещё обрабатывается.'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+            try:
+                # the lock holder before us may have finished right before we took the lock
+                stored_response = cache.get(response_key)
+                if stored_response:
+                    return replay_response(stored_response, fingerprint)
+
+                response = view(request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    cache.set(response_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, timeout=IDEMPOTENCY_TTL)
+                return response
+            finally:
+                # a slow view may outlive the lock, then it belongs to another request already
+                if cache.get(lock_key) == lock_token:
+                    cache.delete(lock_key)
+
+        return wrapper
+    return decorator
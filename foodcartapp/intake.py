@@ -0,0 +1,87 @@
+import json
+import uuid
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+
+ORDER_INTAKE_STREAM = 'star:order_intake'
+ORDER_INTAKE_GROUP = 'order_intake_workers'
+ORDER_INTAKE_STREAM_MAX_LENGTH = 100000
+ORDER_INTAKE_STATUS_TTL = 24 * 60 * 60
+
+
+def get_intake_status_key(order_token):
+    return f'order_intake_status:{order_token}'
+
+
+def get_intake_status(order_token):
+    return cache.get(get_intake_status_key(order_token))
+
+
+def set_intake_status(order_token, intake_status, order_id=None):
+    cache.set(
+        get_intake_status_key(order_token),
+        {'status': intake_status, 'order_id': order_id},
+        timeout=ORDER_INTAKE_STATUS_TTL,
+    )
+
+
+def enqueue_order(order_fields):
+    """
+    Appends an order validated by OrderSerializer to the intake stream, returns its token.
+    The order is saved later by the process_order_intake management command.
+    """
+    order_token = uuid.uuid4().hex
+    payload = {
+        **order_fields,
+        'products': [
+            {'product': fields['product'].id, 'quantity': fields['quantity']}
+            for fields in order_fields['products']
+        ],
+    }
+    set_intake_status(order_token, 'queued')
+    get_redis_connection('default').xadd(
+        ORDER_INTAKE_STREAM,
+        {'token': order_token, 'order': json.dumps(payload, ensure_ascii=False)},
+        maxlen=ORDER_INTAKE_STREAM_MAX_LENGTH,
+        approximate=True,
+    )
+    return order_token
+
+
+def ensure_intake_group(redis):
+    try:
+        redis.xgroup_create(ORDER_INTAKE_STREAM, ORDER_INTAKE_GROUP, id='0', mkstream=True)
+    except ResponseError as error:
+        # the group was created by another worker
+        if 'BUSYGROUP' not in str(error):
+            raise
+
+
+def read_intake_batch(redis, consumer, batch_size, block_ms, pending=False):
+    """
+    Returns [(message id, order token, order payload), ...].
+    pending=True re-reads messages delivered to this consumer but never acknowledged.
+    """
+    streams = redis.xreadgroup(
+        ORDER_INTAKE_GROUP, consumer,
+        {ORDER_INTAKE_STREAM: '0' if pending else '>'},
+        count=batch_size,
+        block=None if pending else block_ms,
+    )
+    messages = []
+    for _, stream_messages in streams or []:
+        for message_id, fields in stream_messages:
+            if not fields:
+                # the message was trimmed from the stream while pending
+                messages.append((message_id, None, None))
+                continue
+            messages.append((message_id, fields[b'token'].decode(), json.loads(fields[b'order'])))
+    return messages
+
+
+def ack_intake_messages(redis, message_ids):
+    if message_ids:
+        redis.xack(ORDER_INTAKE_STREAM, ORDER_INTAKE_GROUP, *message_ids)
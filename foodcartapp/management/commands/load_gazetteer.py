@@ -0,0 +1,32 @@
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.geocoders import GazetteerGeocoder
+
+
+def get_configured_gazetteer_path():
+    for backend_settings in settings.GEOCODER_BACKENDS:
+        if backend_settings['BACKEND'] == 'foodcartapp.geocoders.GazetteerGeocoder':
+            return backend_settings['OPTIONS']['path']
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Loads "address,lat,lon" rows from a CSV file into the local gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--path', help='gazetteer database, the one from GEOCODER_BACKENDS by default')
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_configured_gazetteer_path()
+        if not path:
+            raise CommandError('GazetteerGeocoder is not in GEOCODER_BACKENDS, pass --path')
+
+        with open(options['csv_file'], encoding='utf-8', newline='') as csv_file:
+            rows = [(address, (float(lat), float(lon))) for address, lat, lon in csv.reader(csv_file)]
+
+        GazetteerGeocoder(path).add_many(rows)
+        self.stdout.write(f'Loaded {len(rows)} addresses into {path}')
@@ -0,0 +1,106 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, IntegrityError
+from django_redis import get_redis_connection
+
+from foodcartapp.intake import (
+    ack_intake_messages, ensure_intake_group, read_intake_batch, set_intake_status,
+)
+from foodcartapp.geocoding import submit_geocoding
+from foodcartapp.management.arguments import positive_int
+from foodcartapp.models import Order, Product
+from foodcartapp.views import OrderSerializer, create_orders, get_batch_product_ids
+
+
+class Command(BaseCommand):
+    help = 'Saves orders queued by register_order when ORDER_INTAKE_QUEUE is on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default='worker', help='stable name of this worker in the consumer group')
+        parser.add_argument('--batch-size', type=positive_int, default=200)
+        parser.add_argument('--block-ms', type=int, default=1000, help='how long to wait for new orders')
+        parser.add_argument('--once', action='store_true', help='exit when the stream is drained')
+
+    def handle(self, *args, **options):
+        redis = get_redis_connection('default')
+        ensure_intake_group(redis)
+        self.geocoding_futures = []
+
+        # orders delivered to this consumer before a crash go first
+        pending = True
+        while True:
+            messages = read_intake_batch(
+                redis, options['consumer'], options['batch_size'], options['block_ms'], pending=pending,
+            )
+            if not messages:
+                if pending:
+                    pending = False
+                    continue
+                if options['once']:
+                    self.wait_for_geocoding()
+                    return
+                continue
+
+            saved_count = self.save_orders(messages)
+            ack_intake_messages(redis, [message_id for message_id, _, _ in messages])
+            self.stdout.write(f'Saved {saved_count} of {len(messages)} queued orders')
+
+    def save_orders(self, messages):
+        messages = [(order_token, payload) for _, order_token, payload in messages if order_token]
+        # a redelivered order could have been saved before the worker crashed,
+        # its token is saved in the same transaction as the order
+        saved_order_ids = {}
+        pending_geocode_ids = []
+        already_saved = Order.objects.filter(intake_token__in=[order_token for order_token, _ in messages]) \
+            .values_list('intake_token', 'id', 'geocode_status')
+        for order_token, order_id, geocode_status in already_saved:
+            saved_order_ids[order_token] = order_id
+            set_intake_status(order_token, 'created', order_id)
+            if geocode_status == 'pending':
+                pending_geocode_ids.append(order_id)
+        messages = [(order_token, payload) for order_token, payload in messages if order_token not in saved_order_ids]
+        products = Product.objects.only('price').in_bulk(get_batch_product_ids(payload for _, payload in messages))
+
+        valid_orders = []
+        for order_token, payload in messages:
+            serializer = OrderSerializer(data=payload, context={'products': products})
+            if serializer.is_valid():
+                valid_orders.append((order_token, dict(serializer.validated_data, intake_token=order_token)))
+            else:
+                # e.g. a product was deleted while the order waited in the queue
+                set_intake_status(order_token, 'failed')
+
+        try:
+            with transaction.atomic():
+                orders = create_orders([order_fields for _, order_fields in valid_orders], geocode=False)
+            saved_orders = list(zip(valid_orders, orders))
+        except IntegrityError:
+            saved_orders = self.save_orders_one_by_one(valid_orders)
+
+        for (order_token, _), order in saved_orders:
+            set_intake_status(order_token, 'created', order.id)
+        pending_geocode_ids += [order.id for _, order in saved_orders]
+        if pending_geocode_ids:
+            # the geocoder must not slow the intake down, orders are geocoded while next batches are saved
+            self.geocoding_futures = [future for future in self.geocoding_futures if not future.done()]
+            self.geocoding_futures.append(submit_geocoding(Order, pending_geocode_ids))
+        return len(saved_orders)
+
+    def wait_for_geocoding(self):
+        wait(self.geocoding_futures)
+        for future in self.geocoding_futures:
+            if future.exception():
+                self.stderr.write(f'Failed to geocode saved orders: {future.exception()!r}')
+
+    def save_orders_one_by_one(self, valid_orders):
+        saved_orders = []
+        for order_token, order_fields in valid_orders:
+            try:
+                with transaction.atomic():
+                    order, = create_orders([order_fields], geocode=False)
+            except IntegrityError:
+                set_intake_status(order_token, 'failed')
+                continue
+            saved_orders.append(((order_token, order_fields), order))
+        return saved_orders
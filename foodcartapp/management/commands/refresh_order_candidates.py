@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.candidates import refresh_order_candidates
+from foodcartapp.management.arguments import positive_int
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recomputes candidate restaurants of orders, unprocessed ones by default'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='processed orders too')
+        parser.add_argument('--batch-size', type=positive_int, default=500)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all() if options['all'] else Order.objects.filter(status='unprocessed')
+        order_ids = list(orders.values_list('id', flat=True))
+
+        batch_size = options['batch_size']
+        for start in range(0, len(order_ids), batch_size):
+            refresh_order_candidates(order_ids[start:start + batch_size])
+        self.stdout.write(f'Refreshed candidate restaurants of {len(order_ids)} orders')
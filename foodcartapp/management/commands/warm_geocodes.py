@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.coordinates import get_bulk_cached_coordinates, get_coordinates_cache_key
+from foodcartapp.geocoding import geocode_places
+from foodcartapp.management.arguments import positive_int
+from foodcartapp.models import Order, Restaurant
+
+
+WARM_GEOCODES_CHECKPOINT_KEY = 'warm_geocodes_checkpoint'
+WARM_GEOCODES_CHECKPOINT_TTL = 7 * 24 * 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Geocodes addresses of restaurants and recent orders into the coordinate cache and the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='orders registered within this many days')
+        parser.add_argument('--batch-size', type=positive_int, default=500)
+        parser.add_argument('--rate', type=positive_int, default=10, help='geocoder requests per second')
+        parser.add_argument('--resume', action='store_true', help='skip places handled by an interrupted run')
+
+    def handle(self, *args, **options):
+        checkpoint = cache.get(WARM_GEOCODES_CHECKPOINT_KEY, {}) if options['resume'] else {}
+        self.rate = options['rate']
+        # coordinates by cache key, every spelling of an address is geocoded once per run
+        self.known_coordinates = {}
+        self.unavailable_keys = set()
+
+        since = timezone.now() - timedelta(days=options['days'])
+        querysets = [
+            Restaurant.objects.all(),
+            Order.objects.filter(registered_at__gte=since),
+        ]
+        for queryset in querysets:
+            model_name = queryset.model._meta.model_name
+            queryset = queryset.filter(id__gt=checkpoint.get(model_name, 0)).order_by('id')
+            total = queryset.count()
+            rows = queryset.values_list('id', 'address', 'lat', 'lon', 'geocode_status').iterator()
+
+            done = 0
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                updated_count = self.warm_batch(queryset.model, batch)
+                done += len(batch)
+                checkpoint[model_name] = batch[-1][0]
+                cache.set(WARM_GEOCODES_CHECKPOINT_KEY, checkpoint, timeout=WARM_GEOCODES_CHECKPOINT_TTL)
+                self.stdout.write(f'{model_name}: {done}/{total}, coordinates updated for {updated_count}')
+
+        cache.delete(WARM_GEOCODES_CHECKPOINT_KEY)
+        self.stdout.write(
+            f'Warmed {len(self.known_coordinates)} unique addresses, '
+            f'{len(self.unavailable_keys)} left for later because the geocoder was unavailable'
+        )
+
+    def warm_batch(self, model, batch):
+        """Geocodes addresses of the batch not seen yet, then saves coordinates of places that changed."""
+        new_addresses = {}
+        for _, address, _, _, _ in batch:
+            cache_key = get_coordinates_cache_key(address)
+            if address.strip() and cache_key not in self.known_coordinates and cache_key not in self.unavailable_keys:
+                new_addresses.setdefault(cache_key, address.strip())
+        self.warm_addresses(new_addresses)
+
+        stale_pks = []
+        for pk, address, lat, lon, geocode_status in batch:
+            cache_key = get_coordinates_cache_key(address)
+            if cache_key not in self.known_coordinates:
+                continue
+            coordinates = self.known_coordinates[cache_key]
+            if (lat, lon) != (coordinates or (None, None)) or geocode_status == 'pending':
+                stale_pks.append(pk)
+        if stale_pks:
+            geocode_places(model, stale_pks)
+        return len(stale_pks)
+
+    def warm_addresses(self, addresses):
+        """Takes {cache key: address}, asks the geocoder about cache misses at most self.rate times a second."""
+        cached_coordinates = get_bulk_cached_coordinates(addresses.values(), geocode_misses=False)
+        missed_addresses = [address for address in addresses.values() if address not in cached_coordinates]
+
+        for start in range(0, len(missed_addresses), self.rate):
+            started_at = time.monotonic()
+            cached_coordinates.update(get_bulk_cached_coordinates(missed_addresses[start:start + self.rate]))
+            time.sleep(max(0, 1 - (time.monotonic() - started_at)))
+
+        for cache_key, address in addresses.items():
+            if address in cached_coordinates:
+                self.known_coordinates[cache_key] = cached_coordinates[address]
+            else:
+                self.unavailable_keys.add(cache_key)
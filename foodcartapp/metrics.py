@@ -0,0 +1,17 @@
+import threading
+from collections import Counter
+
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters(prefix=''):
+    """Counters of this worker process, names are dotted like "geocode.lookups"."""
+    with _lock:
+        return {name: value for name, value in sorted(_counters.items()) if name.startswith(prefix)}
@@ -0,0 +1,53 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0049_auto_20200908_1534'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='geocode_status',
+            field=models.CharField(choices=[('pending', 'Ожидает геокодирования'), ('done', 'Координаты найдены'), ('failed', 'Адрес не найден')], db_index=True, default='pending', max_length=20, verbose_name='статус геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='geocoded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='дата геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='широта'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='долгота'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='geocode_status',
+            field=models.CharField(choices=[('pending', 'Ожидает геокодирования'), ('done', 'Координаты найдены'), ('failed', 'Адрес не найден')], db_index=True, default='pending', max_length=20, verbose_name='статус геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='geocoded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='дата геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='широта'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='долгота'),
+        ),
+    ]
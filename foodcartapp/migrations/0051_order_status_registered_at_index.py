@@ -0,0 +1,17 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0050_geocoded_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'registered_at', 'id'], name='foodcartapp_status_618cc3_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:15
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    order_totals = OrderItem.objects.filter(order=OuterRef('pk')).values('order') \
+        .annotate(total=Sum(F('price') * F('quantity'), output_field=models.DecimalField())) \
+        .values('total')
+    Order.objects.filter(order_items__isnull=False).distinct().update(total_price=Subquery(order_totals))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_order_status_registered_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Стоимость заказа'),
+        ),
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_order_total_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderCandidateRestaurant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(blank=True, null=True, verbose_name='Расстояние, км')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidate_restaurants', to='foodcartapp.Order', verbose_name='Заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidate_orders', to='foodcartapp.Restaurant', verbose_name='Ресторан')),
+            ],
+            options={
+                'verbose_name': 'ресторан для заказа',
+                'verbose_name_plural': 'рестораны для заказов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ordercandidaterestaurant',
+            index=models.Index(fields=['order', 'distance_km'], name='foodcartapp_order_i_4a9cb3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ordercandidaterestaurant',
+            unique_together={('order', 'restaurant')},
+        ),
+    ]
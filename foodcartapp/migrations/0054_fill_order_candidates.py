@@ -0,0 +1,99 @@
+# Generated by Django 3.0.7 on 2026-10-18 07:00
+
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations
+
+
+EARTH_RADIUS_KM = 6371.0088
+BATCH_SIZE = 500
+
+
+def get_distance(first_point, second_point):
+    first_lat, first_lon = map(math.radians, first_point)
+    second_lat, second_lon = map(math.radians, second_point)
+    haversine = (
+        math.sin((second_lat - first_lat) / 2) ** 2
+        + math.cos(first_lat) * math.cos(second_lat) * math.sin((second_lon - first_lon) / 2) ** 2
+    )
+    return round(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(haversine, 1))), 2)
+
+
+def get_candidates(order_id, order_point, order_product_ids, restaurants_products, restaurants_points):
+    """Same candidates as foodcartapp.candidates.refresh_order_candidates, computed without its indexes."""
+    restaurant_ids = [
+        restaurant_id for restaurant_id, product_ids in restaurants_products.items()
+        if order_product_ids <= product_ids
+    ]
+    if not order_point:
+        return [(order_id, restaurant_id, None) for restaurant_id in restaurant_ids]
+
+    located = sorted(
+        (get_distance(order_point, restaurants_points[restaurant_id]), restaurant_id)
+        for restaurant_id in restaurant_ids
+        if restaurants_points.get(restaurant_id)
+    )
+    if settings.ORDER_CANDIDATES_RADIUS_KM is not None:
+        located = [(distance, restaurant_id) for distance, restaurant_id in located
+                   if distance <= settings.ORDER_CANDIDATES_RADIUS_KM]
+    if settings.ORDER_CANDIDATES_LIMIT is not None:
+        located = located[:settings.ORDER_CANDIDATES_LIMIT]
+
+    candidates = [(order_id, restaurant_id, distance) for distance, restaurant_id in located]
+    candidates += [
+        (order_id, restaurant_id, None) for restaurant_id in restaurant_ids
+        if not restaurants_points.get(restaurant_id)
+    ]
+    return candidates
+
+
+def fill_order_candidates(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    OrderCandidateRestaurant = apps.get_model('foodcartapp', 'OrderCandidateRestaurant')
+    Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+
+    restaurants_products = defaultdict(set)
+    for restaurant_id, product_id in RestaurantMenuItem.objects.filter(availability=True) \
+            .values_list('restaurant_id', 'product_id'):
+        restaurants_products[restaurant_id].add(product_id)
+    restaurants_points = {
+        restaurant_id: (lat, lon)
+        for restaurant_id, lat, lon in Restaurant.objects.filter(lat__isnull=False, lon__isnull=False)
+        .values_list('id', 'lat', 'lon')
+    }
+
+    order_ids = list(Order.objects.filter(status='unprocessed').order_by('id').values_list('id', flat=True))
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        batch_ids = order_ids[start:start + BATCH_SIZE]
+        orders_products = defaultdict(set)
+        for order_id, product_id in OrderItem.objects.filter(order_id__in=batch_ids) \
+                .values_list('order_id', 'product_id'):
+            orders_products[order_id].add(product_id)
+
+        candidates = []
+        for order_id, lat, lon in Order.objects.filter(id__in=batch_ids).values_list('id', 'lat', 'lon'):
+            if not orders_products[order_id]:
+                continue
+            order_point = (lat, lon) if lat is not None and lon is not None else None
+            candidates += get_candidates(
+                order_id, order_point, orders_products[order_id], restaurants_products, restaurants_points,
+            )
+        OrderCandidateRestaurant.objects.bulk_create(
+            OrderCandidateRestaurant(order_id=order_id, restaurant_id=restaurant_id, distance_km=distance)
+            for order_id, restaurant_id, distance in candidates
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0053_ordercandidaterestaurant'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_candidates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_fill_order_candidates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='intake_token',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True, verbose_name='Токен очереди приёма'),
+        ),
+    ]
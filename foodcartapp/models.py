@@ -1,12 +1,32 @@
 from django.contrib.auth.models import User
 from django.db import models
-from django.core.cache import cache
-from geopy import distance
+from django.db.models import F, Sum
 
-from foodcartapp.utils import fetch_coordinates
+from foodcartapp.capabilities import capability_index
+from foodcartapp.distances import get_orders_restaurants_with_distance
 
 
-class Restaurant(models.Model):
+class GeocodedPlace(models.Model):
+    GEOCODE_STATUSES = (('pending', 'Ожидает геокодирования'),
+                        ('done', 'Координаты найдены'),
+                        ('failed', 'Адрес не найден'))
+    lat = models.FloatField('широта', null=True, blank=True)
+    lon = models.FloatField('долгота', null=True, blank=True)
+    geocode_status = models.CharField('статус геокодирования', max_length=20, choices=GEOCODE_STATUSES,
+                                      default='pending', db_index=True)
+    geocoded_at = models.DateTimeField('дата геокодирования', null=True, blank=True)
+
+    @property
+    def coordinates(self):
+        if self.lat is None or self.lon is None:
+            return None
+        return self.lat, self.lon
+
+    class Meta:
+        abstract = True
+
+
+class Restaurant(GeocodedPlace):
     name = models.CharField('название', max_length=50)
     address = models.CharField('адрес', max_length=100, blank=True)
     contact_phone = models.CharField('контактный телефон', max_length=50, blank=True)
@@ -70,7 +90,7 @@ class RestaurantMenuItem(models.Model):
         ]
 
 
-class Order(models.Model):
+class Order(GeocodedPlace):
     STATUSES = (('unprocessed', 'Необработанный'),
                 ('processed', 'Обработанный'))
     PAYMENT_TYPES = (('online', 'Электронно'),
@@ -85,48 +105,61 @@ class Order(models.Model):
     registered_at = models.DateTimeField('Дата создания заказа', auto_now_add=True, db_index=True)
     called_at = models.DateTimeField('Дата звонка', null=True, blank=True, db_index=True)
     delivered_at = models.DateTimeField('Дата доставки заказа', null=True, blank=True, db_index=True)
+    total_price = models.DecimalField('Стоимость заказа', max_digits=10, decimal_places=2, default=0)
+    # set by process_order_intake, a redelivered queued order must not be saved twice
+    intake_token = models.CharField('Токен очереди приёма', max_length=32, unique=True, null=True, blank=True,
+                                    editable=False)
+
+    def update_total_price(self):
+        total_price = self.order_items.aggregate(
+            total_price=Sum(F('price') * F('quantity'), output_field=models.DecimalField())
+        )['total_price']
+        self.total_price = total_price or 0
+        self.save(update_fields=['total_price'])
 
     def get_order_restaurants(self):
-        """
-        This method generates many queries,
-        please use ".prefetch_related('order_items__product__menu_items__restaurant')".
-        """
-        order_items = self.order_items.all()
-        order_restaurants = []
-        for order_item in order_items:
-            menu_items = order_item.product.menu_items.all()
-            for item in menu_items:
-                if item.restaurant in order_restaurants:
-                    continue
-                order_restaurants.append(item.restaurant)
-        return order_restaurants
+        """Restaurants that can cook every product of the order. For a list of orders use get_orders_restaurants."""
+        return get_orders_restaurants([self])[self.id]
 
     def get_restaurants_with_distance(self):
-        order_restaurants = self.get_order_restaurants()
-        order_address = self.address.strip()
-
-        addresses = [restaurant.address.strip() for restaurant in order_restaurants]
-        addresses.append(order_address)
+        """
+        Uses coordinates persisted by foodcartapp.geocoding, never calls the geocoder.
+        Restaurants with unknown distance go last with None instead of the distance.
+        For a list of orders use foodcartapp.distances.get_orders_restaurants_with_distance.
+        """
+        return get_orders_restaurants_with_distance([self], get_orders_restaurants([self]))[self.id]
 
-        coordinates = get_bulk_cached_coordinates(addresses)
+    def __str__(self):
+        return f"{self.firstname} {self.lastname}, {self.address}"
 
-        order_coordinates = coordinates.get(order_address)
+    class Meta:
+        verbose_name = 'заказ'
+        verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(fields=['status', 'registered_at', 'id']),
+        ]
 
-        restaurants_with_distance = []
-        for restaurant in order_restaurants:
-            restaurant_address = restaurant.address.strip()
-            restaurant_coordinates = coordinates.get(restaurant_address)
-            restaurant_distance = round(distance.distance(order_coordinates, restaurant_coordinates).km, 2)
-            restaurants_with_distance.append((restaurant.name, restaurant_distance))
 
-        return sorted(restaurants_with_distance, key=lambda restaurant: restaurant[1])
+class OrderCandidateRestaurant(models.Model):
+    """Restaurants able to cook the whole order, kept up to date by foodcartapp.candidates."""
+    order = models.ForeignKey(Order, related_name='candidate_restaurants', on_delete=models.CASCADE,
+                              verbose_name='Заказ')
+    restaurant = models.ForeignKey(Restaurant, related_name='candidate_orders', on_delete=models.CASCADE,
+                                   verbose_name='Ресторан')
+    distance_km = models.FloatField('Расстояние, км', null=True, blank=True)
 
     def __str__(self):
-        return f"{self.firstname} {self.lastname}, {self.address}"
+        return f"{self.restaurant.name}, {self.order}"
 
     class Meta:
-        verbose_name = 'заказ'
-        verbose_name_plural = 'заказы'
+        verbose_name = 'ресторан для заказа'
+        verbose_name_plural = 'рестораны для заказов'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(fields=['order', 'distance_km']),
+        ]
 
 
 class OrderItem(models.Model):
@@ -143,22 +176,18 @@ class OrderItem(models.Model):
         verbose_name_plural = 'элементы заказа'
 
 
-def get_cached_coordinates(address):
-    address = address.strip()
-    cache_coordinates = cache.get(address)
-    if not cache_coordinates:
-        fetched_coordinates = fetch_coordinates(address)
-        cache.set(address, fetched_coordinates)
-    cache_coordinates = cache.get(address)
-    return cache_coordinates
-
-
-def get_bulk_cached_coordinates(addresses):
-    coordinates = cache.get_many(addresses)
+def get_orders_restaurants(orders):
+    """
+    Returns {order.id: [restaurants that can cook every product of the order]}.
+    Needs only ".prefetch_related('order_items')", restaurants are fetched with a single query.
+    """
+    orders_products = {order.id: [item.product_id for item in order.order_items.all()] for order in orders}
+    orders_restaurant_ids = capability_index.get_bulk_candidate_restaurant_ids(orders_products)
 
-    for address in addresses:
-        if address not in coordinates:
-            address_coordinates = get_cached_coordinates(address)
-            coordinates[address] = address_coordinates
+    restaurant_ids = {restaurant_id for ids in orders_restaurant_ids.values() for restaurant_id in ids}
+    restaurants = Restaurant.objects.in_bulk(restaurant_ids) if restaurant_ids else {}
+    return {
+        order_id: [restaurants[restaurant_id] for restaurant_id in ids if restaurant_id in restaurants]
+        for order_id, ids in orders_restaurant_ids.items()
+    }
 
-    return coordinates
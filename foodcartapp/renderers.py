@@ -0,0 +1,25 @@
+import json
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+def dump_api_json(data):
+    """
+    Serializes plain data of the public API: dicts, lists, strings and numbers only.
+    Compact unless settings.API_JSON_INDENT is set, so the stdlib C encoder does the work.
+    """
+    indent = settings.API_JSON_INDENT
+    separators = None if indent else COMPACT_SEPARATORS
+    return json.dumps(data, ensure_ascii=False, indent=indent, separators=separators).encode()
+
+
+class APIJSONRenderer(JSONRenderer):
+    """Renders DRF responses in the same wire mode as dump_api_json."""
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        indent = super().get_indent(accepted_media_type, renderer_context)
+        return indent if indent is not None else settings.API_JSON_INDENT
@@ -0,0 +1,62 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from foodcartapp.candidates import refresh_product_candidates
+from foodcartapp.capabilities import capability_index
+from foodcartapp.catalog import invalidate_catalog
+from foodcartapp.models import Product, ProductCategory, Restaurant, RestaurantMenuItem
+from foodcartapp.spatial import spatial_index
+
+
+_pending_menu_changes = threading.local()
+
+
+def apply_menu_changes():
+    """Patches the capability index in the order of changes, then refreshes candidates of their products once."""
+    changes, _pending_menu_changes.changes = _pending_menu_changes.changes, []
+    for apply_change, menu_item in changes:
+        apply_change(menu_item)
+    refresh_product_candidates({menu_item.product_id for _, menu_item in changes})
+
+
+def schedule_menu_change(apply_change, menu_item):
+    """
+    Collects menu item changes of the transaction for one callback on commit:
+    deleting a restaurant or saving its menu inline changes hundreds of items.
+    """
+    connection = transaction.get_connection()
+    if any(callback is apply_menu_changes for _, callback in connection.run_on_commit):
+        _pending_menu_changes.changes.append((apply_change, menu_item))
+    else:
+        # the first change of a transaction, changes left here were rolled back
+        _pending_menu_changes.changes = [(apply_change, menu_item)]
+        transaction.on_commit(apply_menu_changes)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def update_capability_index(sender, instance, **kwargs):
+    schedule_menu_change(capability_index.update_menu_item, instance)
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def remove_from_capability_index(sender, instance, **kwargs):
+    schedule_menu_change(capability_index.remove_menu_item, instance)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_spatial_index(sender, **kwargs):
+    transaction.on_commit(spatial_index.invalidate)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_product_catalog(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
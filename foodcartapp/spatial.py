@@ -0,0 +1,146 @@
+import math
+import threading
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from foodcartapp.distances import EARTH_RADIUS_KM
+
+
+SPATIAL_INDEX_VERSION_KEY = 'restaurant_spatial_index_version'
+CELL_SIZE_DEGREES = 0.05
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def get_haversine_distance(first_point, second_point):
+    first_lat, first_lon = map(math.radians, first_point)
+    second_lat, second_lon = map(math.radians, second_point)
+    haversine = (
+        math.sin((second_lat - first_lat) / 2) ** 2
+        + math.cos(first_lat) * math.cos(second_lat) * math.sin((second_lon - first_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(haversine, 1)))
+
+
+class RestaurantSpatialIndex:
+    """
+    Grid of restaurant coordinates for nearest-restaurant queries.
+
+    Restaurants are bucketed into square cells of CELL_SIZE_DEGREES, a query scans
+    rings of cells around the point and stops once no unscanned cell can be closer
+    than the k-th restaurant found. The index is rebuilt lazily after invalidate(),
+    which bumps the version in the cache so every worker notices.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE_DEGREES):
+        self.cell_size = cell_size
+        self._lock = threading.Lock()
+        self._version = None
+        self._cells = {}
+        self._bounds = None
+
+    def _get_cell(self, point):
+        lat, lon = point
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def rebuild(self):
+        from foodcartapp.models import Restaurant
+
+        version = cache.get_or_set(SPATIAL_INDEX_VERSION_KEY, 0, timeout=None)
+        restaurants = Restaurant.objects.filter(lat__isnull=False, lon__isnull=False).values_list('id', 'lat', 'lon')
+
+        cells = defaultdict(list)
+        for restaurant_id, lat, lon in restaurants.iterator():
+            cells[self._get_cell((lat, lon))].append((restaurant_id, (lat, lon)))
+
+        self._cells = dict(cells)
+        self._bounds = None
+        if cells:
+            rows = [row for row, _ in cells]
+            columns = [column for _, column in cells]
+            self._bounds = min(rows), max(rows), min(columns), max(columns)
+        self._version = version
+
+    def invalidate(self):
+        try:
+            cache.incr(SPATIAL_INDEX_VERSION_KEY)
+        except ValueError:
+            cache.set(SPATIAL_INDEX_VERSION_KEY, 0, timeout=None)
+        self._version = None
+
+    def _ensure_fresh(self):
+        if self._version is None or cache.get(SPATIAL_INDEX_VERSION_KEY) != self._version:
+            self.rebuild()
+
+    def _iter_ring(self, center, ring):
+        row, column = center
+        if not ring:
+            yield center
+            return
+        for offset in range(-ring, ring + 1):
+            yield row - ring, column + offset
+            yield row + ring, column + offset
+        for offset in range(-ring + 1, ring):
+            yield row + offset, column - ring
+            yield row + offset, column + ring
+
+    def nearest(self, point, k=None, radius_km=None, restaurant_ids=None):
+        """
+        Returns [(restaurant id, distance km), ...] sorted by distance: the k nearest
+        restaurants within radius_km, optionally only among restaurant_ids.
+        k=None means all restaurants within the radius.
+        """
+        if restaurant_ids is not None:
+            restaurant_ids = set(restaurant_ids)
+            if not restaurant_ids:
+                return []
+
+        with self._lock:
+            self._ensure_fresh()
+            cells, bounds = self._cells, self._bounds
+        if not bounds:
+            return []
+
+        center = self._get_cell(point)
+        min_row, max_row, min_column, max_column = bounds
+        max_ring = max(
+            abs(center[0] - min_row), abs(center[0] - max_row),
+            abs(center[1] - min_column), abs(center[1] - max_column),
+        )
+        # the lon side of a cell is the shortest one away from the equator
+        cell_km = self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(abs(point[0]) + self.cell_size)), 0.01)
+
+        found = []
+
+        def collect(cell_restaurants):
+            for restaurant_id, restaurant_point in cell_restaurants:
+                if restaurant_ids is not None and restaurant_id not in restaurant_ids:
+                    continue
+                restaurant_distance = get_haversine_distance(point, restaurant_point)
+                if radius_km is None or restaurant_distance <= radius_km:
+                    found.append((restaurant_id, restaurant_distance))
+
+        for ring in range(max_ring + 1):
+            if (2 * ring + 1) ** 2 > 4 * len(cells):
+                # rings got wider than the grid itself is dense, scanning what is left is cheaper
+                for cell, cell_restaurants in cells.items():
+                    if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= ring:
+                        collect(cell_restaurants)
+                break
+
+            for cell in self._iter_ring(center, ring):
+                collect(cells.get(cell, []))
+
+            unscanned_distance = ring * cell_km
+            if radius_km is not None and unscanned_distance > radius_km:
+                break
+            if k is not None and len(found) >= k:
+                found.sort(key=lambda restaurant: restaurant[1])
+                if found[k - 1][1] <= unscanned_distance:
+                    break
+
+        found.sort(key=lambda restaurant: restaurant[1])
+        return found[:k] if k is not None else found
+
+
+spatial_index = RestaurantSpatialIndex()
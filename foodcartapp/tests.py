@@ -0,0 +1,366 @@
+import hashlib
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+import requests
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from foodcartapp.addresses import normalize_address
+from foodcartapp.benchmark import BENCHMARK_CACHES, BENCHMARK_GEOCODER_BACKENDS, BenchmarkTestCase, DATA_SIZES, measure
+from foodcartapp.candidates import get_orders_candidates, refresh_order_candidates
+from foodcartapp.geocoders import CircuitBreakerGeocoder, GazetteerGeocoder, GeocoderUnavailable
+from foodcartapp.idempotency import IDEMPOTENCY_KEY_MAX_LENGTH, idempotent
+from foodcartapp.models import Order, OrderItem, Product, ProductCategory, Restaurant, RestaurantMenuItem
+
+
+# Query budgets do not depend on the data size, time budgets are generous
+# to survive slow CI machines but still catch O(n) queries and O(n²) loops.
+# Memory tracing slows code down a few times, budgets account for that.
+PRODUCT_LIST_COLD_QUERIES = 1
+PRODUCT_LIST_WARM_QUERIES = 0
+PRODUCT_LIST_WALL_TIME = {'small': 0.2, 'medium': 0.5, 'large': 1}
+REGISTER_ORDER_QUERIES = 12
+REGISTER_ORDER_WALL_TIME = 0.3
+RESTAURANTS_WITH_DISTANCE_QUERIES = 3
+RESTAURANTS_WITH_DISTANCE_WALL_TIME = 0.1
+PEAK_MEMORY = 20 * 1024 * 1024
+
+
+class ProductListApiBenchmark(BenchmarkTestCase):
+    def test_product_list_api(self):
+        for size in DATA_SIZES:
+            with self.data_of_size(size):
+                with measure() as cold:
+                    response = self.client.get('/api/products/')
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget(
+                    cold,
+                    queries=PRODUCT_LIST_COLD_QUERIES,
+                    wall_time=PRODUCT_LIST_WALL_TIME[size],
+                    peak_memory=PEAK_MEMORY,
+                )
+
+                with measure() as warm:
+                    self.client.get('/api/products/')
+                self.assertWithinBudget(warm, queries=PRODUCT_LIST_WARM_QUERIES)
+
+                with measure() as not_modified:
+                    response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertWithinBudget(not_modified, queries=0)
+
+
+class RegisterOrderBenchmark(BenchmarkTestCase):
+    def test_register_order_does_not_depend_on_cart_size(self):
+        for size in DATA_SIZES:
+            with self.data_of_size(size):
+                product_ids = Product.objects.values_list('id', flat=True)[:20]
+                for cart_size in (1, 20):
+                    order = {
+                        'firstname': 'Иван',
+                        'lastname': 'Петров',
+                        'phonenumber': '+79001234567',
+                        'address': 'order address',
+                        'products': [{'product': product_id, 'quantity': 2} for product_id in product_ids[:cart_size]],
+                    }
+                    with measure() as measurement:
+                        response = self.client.post('/api/order/', order, content_type='application/json')
+                    self.assertEqual(response.status_code, 200, response.content)
+                    self.assertWithinBudget(
+                        measurement,
+                        queries=REGISTER_ORDER_QUERIES,
+                        wall_time=REGISTER_ORDER_WALL_TIME,
+                        peak_memory=PEAK_MEMORY,
+                    )
+
+
+class RestaurantsWithDistanceBenchmark(BenchmarkTestCase):
+    def test_get_restaurants_with_distance(self):
+        for size in DATA_SIZES:
+            with self.data_of_size(size) as orders:
+                # warm up the capability index, it is built once per process
+                orders[0].get_restaurants_with_distance()
+
+                order = Order.objects.prefetch_related('order_items').get(id=orders[-1].id)
+                with measure() as measurement:
+                    restaurants = order.get_restaurants_with_distance()
+                self.assertTrue(restaurants)
+                self.assertWithinBudget(
+                    measurement,
+                    queries=RESTAURANTS_WITH_DISTANCE_QUERIES,
+                    wall_time=RESTAURANTS_WITH_DISTANCE_WALL_TIME,
+                    peak_memory=PEAK_MEMORY,
+                )
+
+
+@override_settings(CACHES=BENCHMARK_CACHES, GEOCODER_BACKENDS=BENCHMARK_GEOCODER_BACKENDS)
+class RegisterOrdersBatchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = ProductCategory.objects.create(name='Бургеры')
+        self.product = Product.objects.create(name='Бургер', category=category, price=Decimal(300), image='burger.jpg')
+
+    def make_order(self, products):
+        return {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'order address',
+            'products': products,
+        }
+
+    def test_valid_orders_are_saved_next_to_invalid_ones(self):
+        orders = [
+            self.make_order([{'product': self.product.id, 'quantity': 2}]),
+            self.make_order([{'product': self.product.id + 1000, 'quantity': 1}]),
+            {'firstname': 'Иван'},
+            self.make_order([]),
+        ]
+        response = self.client.post('/api/orders/batch/', {'orders': orders}, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        valid, unknown_product, malformed, empty_cart = response.json()['orders']
+        order = Order.objects.get()
+        self.assertEqual(valid, {'order_id': order.id})
+        self.assertEqual(order.total_price, Decimal(600))
+        self.assertIn('product', unknown_product['errors']['products'][0])
+        self.assertIn('lastname', malformed['errors'])
+        self.assertIn('products', empty_cart['errors'])
+
+    def test_empty_cart_is_rejected_by_register_order(self):
+        response = self.client.post('/api/order/', self.make_order([]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('products', response.json())
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(CACHES=BENCHMARK_CACHES, ORDER_CANDIDATES_LIMIT=2, ORDER_CANDIDATES_RADIUS_KM=None)
+class OrderCandidatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(name='Бургер', price=Decimal(300), image='burger.jpg')
+        restaurants = [
+            Restaurant(name='Рядом', lat=55.751, lon=37.618, geocode_status='done'),
+            Restaurant(name='Недалеко', lat=55.76, lon=37.62, geocode_status='done'),
+            Restaurant(name='Далеко', lat=55.9, lon=37.8, geocode_status='done'),
+            Restaurant(name='Без адреса', geocode_status='failed'),
+        ]
+        for restaurant in restaurants:
+            restaurant.save()
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+            address='order address',
+            lat=55.75,
+            lon=37.617,
+            geocode_status='done',
+        )
+        OrderItem.objects.create(order=self.order, product=product, quantity=1, price=product.price)
+
+    def get_candidate_names(self):
+        refresh_order_candidates([self.order.id])
+        return [name for name, _ in get_orders_candidates([self.order.id])[self.order.id]]
+
+    def test_nearest_restaurants_are_candidates(self):
+        self.assertEqual(self.get_candidate_names(), ['Рядом', 'Недалеко', 'Без адреса'])
+
+    @override_settings(ORDER_CANDIDATES_LIMIT=None, ORDER_CANDIDATES_RADIUS_KM=5)
+    def test_restaurants_within_radius_are_candidates(self):
+        self.assertEqual(self.get_candidate_names(), ['Рядом', 'Недалеко', 'Без адреса'])
+
+    @override_settings(ORDER_CANDIDATES_LIMIT=None)
+    def test_all_restaurants_are_candidates_without_limits(self):
+        self.assertEqual(self.get_candidate_names(), ['Рядом', 'Недалеко', 'Далеко', 'Без адреса'])
+
+
+@override_settings(CACHES=BENCHMARK_CACHES, GEOCODER_BACKENDS=BENCHMARK_GEOCODER_BACKENDS)
+class RegisterOrderIdempotencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Бургер', price=Decimal(300), image='burger.jpg')
+        self.order = {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'order address',
+            'products': [{'product': self.product.id, 'quantity': 1}],
+        }
+
+    def register_order(self, order, idempotency_key):
+        return self.client.post(
+            '/api/order/', order, content_type='application/json', HTTP_IDEMPOTENCY_KEY=idempotency_key,
+        )
+
+    def get_lock_key(self, scope, idempotency_key):
+        return f'idempotency:{scope}:{hashlib.sha256(idempotency_key.encode()).hexdigest()}:lock'
+
+    def test_retry_replays_the_response(self):
+        first = self.register_order(self.order, 'retry')
+        retry = self.register_order(self.order, 'retry')
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_other_data_is_rejected(self):
+        self.register_order(self.order, 'reused')
+        response = self.register_order(dict(self.order, address='other address'), 'reused')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @mock.patch('foodcartapp.idempotency.IDEMPOTENCY_LOCK_WAIT', 0)
+    def test_request_in_progress_is_a_conflict(self):
+        cache.set(self.get_lock_key('register_order', 'in-progress'), 'another request')
+        response = self.register_order(self.order, 'in-progress')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_too_long_key_is_rejected(self):
+        response = self.register_order(self.order, 'k' * (IDEMPOTENCY_KEY_MAX_LENGTH + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_lock_taken_over_by_another_request_is_kept(self):
+        lock_key = self.get_lock_key('slow_view', 'slow')
+
+        @api_view(['POST'])
+        @idempotent('slow_view')
+        def slow_view(request):
+            # the lock expired while the view ran and another request took it
+            cache.set(lock_key, 'another request')
+            return Response({})
+
+        request = APIRequestFactory().post('/', {}, format='json', HTTP_IDEMPOTENCY_KEY='slow')
+        self.assertEqual(slow_view(request).status_code, 200)
+        self.assertEqual(cache.get(lock_key), 'another request')
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_spellings_of_an_address_share_a_form(self):
+        self.assertEqual(normalize_address('Москва, ул. Тверская 1'), 'москва улица тверская 1')
+        self.assertEqual(normalize_address('москва ул тверская, 1'), 'москва улица тверская 1')
+        self.assertEqual(normalize_address('  МОСКВА,  Улица   Тверская,   д. 1 '), 'москва улица тверская 1')
+        self.assertEqual(normalize_address('г. Москва, пр-т Мира, дом 5'), 'москва проспект мира 5')
+        self.assertEqual(normalize_address('Москва, Ленинский просп., 2/1'), 'москва ленинский проспект 2/1')
+
+    def test_initials_are_kept(self):
+        self.assertEqual(normalize_address('Москва, ул. Д. Ульянова 3'), 'москва улица д ульянова 3')
+        self.assertNotEqual(normalize_address('Москва, ул. Д. Ульянова 3'), normalize_address('Москва, ул. Ульянова 3'))
+        self.assertEqual(normalize_address('Москва, ул. Г. Титова, д. 7'), 'москва улица г титова 7')
+
+
+class GazetteerGeocoderTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.gazetteer = GazetteerGeocoder(os.path.join(directory.name, 'gazetteer.sqlite3'))
+        self.gazetteer.add_many([
+            ('Москва, ул. Тверская 12', (55.71, 37.61)),
+            ('Москва, ул. Тверская 1, стр. 2', (55.76, 37.61)),
+            ('Москва, пр-т Мира 5', (55.78, 37.63)),
+        ])
+
+    def test_exact_match(self):
+        self.assertEqual(self.gazetteer.geocode('москва улица тверская 12'), (55.71, 37.61))
+        self.assertEqual(self.gazetteer.geocode('Москва, проспект Мира, 5'), (55.78, 37.63))
+
+    def test_prefix_match(self):
+        self.assertEqual(self.gazetteer.geocode('Москва, пр-т Мира'), (55.78, 37.63))
+
+    def test_prefix_match_takes_whole_house_numbers(self):
+        self.assertEqual(self.gazetteer.geocode('Москва, ул. Тверская 1'), (55.76, 37.61))
+        with self.assertRaises(LookupError):
+            self.gazetteer.geocode('Москва, пр-т Мира 50')
+
+
+class StubGeocoder:
+    """Answers with the queued results in turn, an exception instance is raised."""
+
+    def __init__(self):
+        self.results = []
+        self.calls = 0
+
+    def geocode(self, place):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@override_settings(CACHES=BENCHMARK_CACHES)
+class CircuitBreakerGeocoderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreakerGeocoder(
+            'stub',
+            {'BACKEND': 'foodcartapp.tests.StubGeocoder'},
+            failure_threshold=3,
+        )
+        self.backend = self.breaker.backend
+
+    def fail_backend(self, times):
+        self.backend.results += [requests.ConnectionError()] * times
+        for _ in range(times):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.geocode('Москва')
+
+    def wait_for_reset(self):
+        cache.delete(self.breaker.open_key)
+
+    def test_opens_after_threshold_failures_within_window(self):
+        self.fail_backend(2)
+        self.backend.results.append((55.75, 37.61))
+        self.assertEqual(self.breaker.geocode('Москва'), (55.75, 37.61))
+
+        self.fail_backend(1)
+        with self.assertRaises(GeocoderUnavailable):
+            self.breaker.geocode('Москва')
+        self.assertEqual(self.backend.calls, 4)
+
+    def test_successful_probe_closes_the_circuit(self):
+        self.fail_backend(3)
+        self.wait_for_reset()
+        self.backend.results += [(55.75, 37.61), (55.76, 37.62)]
+        self.assertEqual(self.breaker.geocode('Москва'), (55.75, 37.61))
+        self.assertEqual(self.breaker.geocode('Москва'), (55.76, 37.62))
+
+    def test_failed_probe_opens_the_circuit_again(self):
+        self.fail_backend(3)
+        self.wait_for_reset()
+        self.fail_backend(1)
+        with self.assertRaises(GeocoderUnavailable):
+            self.breaker.geocode('Москва')
+
+    def test_only_one_probe_is_let_through(self):
+        self.fail_backend(3)
+        self.wait_for_reset()
+        cache.add(self.breaker.probe_key, 1)
+        with self.assertRaises(GeocoderUnavailable):
+            self.breaker.geocode('Москва')
+        self.assertEqual(self.backend.calls, 3)
+
+    def test_address_not_found_is_not_a_failure(self):
+        self.backend.results += [LookupError('Москва')] * 5
+        for _ in range(5):
+            with self.assertRaises(LookupError):
+                self.breaker.geocode('Москва')
+        self.assertEqual(self.backend.calls, 5)
+
+        self.fail_backend(3)
+        self.wait_for_reset()
+        self.backend.results.append(LookupError('Москва'))
+        with self.assertRaises(LookupError):
+            self.breaker.geocode('Москва')
+        self.backend.results.append((55.75, 37.61))
+        self.assertEqual(self.breaker.geocode('Москва'), (55.75, 37.61))
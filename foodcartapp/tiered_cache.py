@@ -0,0 +1,249 @@
+"""
+A bounded in-process LRU in front of the default cache for hot keys.
+
+Writes and deletes go to both tiers and are announced over Redis pub/sub, so other workers
+drop their local copies. A lost announcement is bounded by the local timeout of the entry.
+A read of any number of keys is one round trip to Redis, so is a write together with its announcement.
+Hits and misses of each tier are counted as "cache.<name>.local.hits", "cache.<name>.shared.misses" etc.,
+Redis round trips as "cache.<name>.round_trips".
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from foodcartapp.metrics import increment
+
+
+INVALIDATION_CHANNEL = 'star:local_cache_invalidation'
+LISTENER_RECONNECT_DELAY = 1
+
+
+class LocalCache:
+    """LRU of at most max_size entries, each one expires timeout seconds after it was set."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping, timeout=None):
+        expires_at = time.monotonic() + min(timeout or self.timeout, self.timeout)
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TieredCache:
+    """Cache API subset backed by a LocalCache of this process and the default cache shared by workers."""
+
+    def __init__(self, name, max_size, local_timeout, announce=True):
+        self.name = name
+        self.local = LocalCache(max_size, local_timeout)
+        # values that never change under their key, like distances between points, need no announcements
+        self.announce = announce
+        tiered_caches[name] = self
+
+    def get_many(self, keys):
+        start_invalidation_listener()
+        keys = list(keys)
+        found = self.local.get_many(keys)
+        missed_keys = [key for key in keys if key not in found]
+        increment(f'cache.{self.name}.local.hits', len(found))
+        increment(f'cache.{self.name}.local.misses', len(missed_keys))
+        if not missed_keys:
+            return found
+
+        shared_found = cache.get_many(missed_keys)
+        increment(f'cache.{self.name}.round_trips')
+        increment(f'cache.{self.name}.shared.hits', len(shared_found))
+        increment(f'cache.{self.name}.shared.misses', len(missed_keys) - len(shared_found))
+        self.local.set_many(shared_found)
+        found.update(shared_found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many_with_timeouts(self, entries):
+        """Sets {key: (value, timeout)} and announces the keys in one round trip to Redis."""
+        if not entries:
+            return
+        connection = get_invalidation_connection()
+        if connection is None:
+            for timeout, mapping in group_by_timeout(entries).items():
+                cache.set_many(mapping, timeout=timeout)
+                increment(f'cache.{self.name}.round_trips')
+        else:
+            started_at = time.perf_counter()
+            pipeline = connection.pipeline(transaction=False)
+            for key, (value, timeout) in entries.items():
+                pipeline.set(cache.client.make_key(key), cache.client.encode(value), ex=timeout)
+            if self.announce:
+                pipeline.publish(INVALIDATION_CHANNEL, dump_invalidation(self.name, list(entries)))
+            pipeline.execute()
+            increment(f'cache.{self.name}.round_trips')
+            report_to_debug_toolbar('set_many', started_at, list(entries))
+
+        for timeout, mapping in group_by_timeout(entries).items():
+            self.local.set_many(mapping, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        self.set_many_with_timeouts({key: (value, timeout) for key, value in mapping.items()})
+
+    def set(self, key, value, timeout=None):
+        self.set_many({key: value}, timeout)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        connection = get_invalidation_connection()
+        if connection is None:
+            cache.delete_many(keys)
+        else:
+            started_at = time.perf_counter()
+            pipeline = connection.pipeline(transaction=False)
+            pipeline.delete(*[cache.client.make_key(key) for key in keys])
+            if self.announce:
+                pipeline.publish(INVALIDATION_CHANNEL, dump_invalidation(self.name, keys))
+            pipeline.execute()
+            report_to_debug_toolbar('delete_many', started_at, keys)
+        increment(f'cache.{self.name}.round_trips')
+        self.local.delete_many(keys)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+
+def group_by_timeout(entries):
+    groups = {}
+    for key, (value, timeout) in entries.items():
+        groups.setdefault(timeout, {})[key] = value
+    return groups
+
+
+def report_to_debug_toolbar(method_name, started_at, keys):
+    """Pipelines bypass the cache API, so the toolbar cache panel is told about them explicitly."""
+    if not apps.is_installed('debug_toolbar'):
+        return
+    from debug_toolbar.panels.cache import cache_called
+
+    cache_called.send(
+        sender=TieredCache,
+        name=method_name,
+        time_taken=time.perf_counter() - started_at,
+        return_value=None,
+        args=(keys,),
+        kwargs={},
+        trace=[],
+        template_info=None,
+        backend=cache,
+    )
+
+
+tiered_caches = {}
+# announcements of this process are skipped by its own listener, the local tier already has the new values
+sender_id = uuid.uuid4().hex
+
+
+def renew_sender_id():
+    # workers forked from a preloaded master must not share its id
+    global sender_id
+    sender_id = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=renew_sender_id)
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def get_invalidation_connection():
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        # the default cache is not Redis, e.g. locmem in tests, a single process has nothing to announce
+        return None
+
+
+def dump_invalidation(name, keys):
+    return json.dumps({'cache': name, 'keys': keys, 'sender': sender_id})
+
+
+def drop_invalidated_keys(message):
+    invalidation = json.loads(message['data'])
+    if invalidation.get('sender') == sender_id:
+        return
+    tiered_cache = tiered_caches.get(invalidation['cache'])
+    if tiered_cache:
+        tiered_cache.local.delete_many(invalidation['keys'])
+
+
+def clear_local_caches():
+    for tiered_cache in tiered_caches.values():
+        tiered_cache.local.clear()
+
+
+def listen_for_invalidations(connection):
+    while True:
+        try:
+            pubsub = connection.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # announcements made while we were not subscribed are lost
+            clear_local_caches()
+            for message in pubsub.listen():
+                drop_invalidated_keys(message)
+        except RedisError:
+            time.sleep(LISTENER_RECONNECT_DELAY)
+
+
+def start_invalidation_listener():
+    global _listener_started
+    if _listener_started:
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        connection = get_invalidation_connection()
+        if connection is not None:
+            threading.Thread(target=listen_for_invalidations, args=(connection,), daemon=True).start()
+        _listener_started = True
+
+
+coordinates_cache = TieredCache('coordinates', max_size=10000, local_timeout=5 * 60)
+catalog_cache = TieredCache('catalog', max_size=16, local_timeout=60)
+distances_cache = TieredCache('distances', max_size=100000, local_timeout=24 * 60 * 60, announce=False)
@@ -1,14 +1,38 @@
-import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from foodcartapp.geocoders import GEOCODER_ERRORS, GEOCODER_POOL_SIZE, GEOCODER_UNAVAILABLE_ERRORS, get_geocoder
+
+
+GEOCODER_MAX_WORKERS = GEOCODER_POOL_SIZE
 
 
 def fetch_coordinates(place):
-    apikey = os.getenv("YA_APIKEY")
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    params = {"geocode": place, "apikey": apikey, "format": "json"}
-    response = requests.get(base_url, params=params)
-    response.raise_for_status()
-    places_found = response.json()['response']['GeoObjectCollection']['featureMember']
-    most_relevant = places_found[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return float(lat), float(lon)
+    return get_geocoder().geocode(place)
+
+
+GEOCODER_UNAVAILABLE = object()
+
+
+def fetch_bulk_coordinates(places):
+    """
+    Geocode places concurrently with the configured geocoders. Places that were not found
+    are mapped to None, places the geocoders could not be asked about are left out.
+    """
+    places = list(places)
+    if not places:
+        return {}
+
+    def fetch(place):
+        try:
+            return place, fetch_coordinates(place)
+        except GEOCODER_UNAVAILABLE_ERRORS:
+            return place, GEOCODER_UNAVAILABLE
+        except GEOCODER_ERRORS:
+            return place, None
+
+    with ThreadPoolExecutor(max_workers=min(GEOCODER_MAX_WORKERS, len(places))) as executor:
+        return {
+            place: coordinates
+            for place, coordinates in executor.map(fetch, places)
+            if coordinates is not GEOCODER_UNAVAILABLE
+        }
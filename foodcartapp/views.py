@@ -1,14 +1,34 @@
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
 from django.templatetags.static import static
-from django.http import JsonResponse
-from django.db import transaction, IntegrityError
+from django.http import HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db import connection, transaction
+from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import IntegerField, ModelSerializer, PrimaryKeyRelatedField, ValidationError
+
+from foodcartapp.candidates import refresh_order_candidates
+from foodcartapp.catalog import get_catalog_payload, get_catalog_version, get_catalog_etag
+from foodcartapp.models import Order, OrderItem, Product
+from foodcartapp.geocoding import geocode_in_background
+from foodcartapp.idempotency import idempotent
+from foodcartapp.intake import enqueue_order, get_intake_status
+from foodcartapp.renderers import dump_api_json
+
 
-from foodcartapp.models import Product, Order, OrderItem
+API_MAX_AGE = 60
+ORDERS_BATCH_MAX_SIZE = 500
 
 
 class OrderProductSerializer(ModelSerializer):
+    # resolved for the whole order at once in OrderSerializer.validate_products
+    product = IntegerField()
 
     class Meta:
         model = OrderItem
@@ -22,10 +42,30 @@ class OrderSerializer(ModelSerializer):
         model = Order
         fields = ['firstname', 'lastname', 'phonenumber', 'address', 'products']
 
+    def validate_products(self, products_fields):
+        if not products_fields:
+            raise ValidationError('Этот список не может быть пустым.')
+        product_ids = {fields['product'] for fields in products_fields}
+        # batch submissions fetch products for all orders at once and pass them in the context
+        products = self.context.get('products')
+        if products is None:
+            products = Product.objects.only('price').in_bulk(product_ids)
 
-def banners_list_api(request):
+        does_not_exist = PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+        errors = [
+            {} if fields['product'] in products else {'product': [does_not_exist.format(pk_value=fields['product'])]}
+            for fields in products_fields
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+
+        return [{**fields, 'product': products[fields['product']]} for fields in products_fields]
+
+
+@lru_cache()
+def get_banners_payload():
     # FIXME move data to db?
-    return JsonResponse([
+    banners = [
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -41,64 +81,141 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    ]
+    payload = dump_api_json(banners)
+    return hashlib.md5(payload).hexdigest(), payload
+
+
+@cache_control(public=True, max_age=API_MAX_AGE)
+@condition(etag_func=lambda request: get_banners_payload()[0])
+def banners_list_api(request):
+    _, payload = get_banners_payload()
+    return HttpResponse(payload, content_type='application/json')
+
 
+def get_product_list_etag(request):
+    # the view serves the payload of the same version, one cache read per request
+    request.catalog_version = get_catalog_version()
+    return get_catalog_etag(request.catalog_version)
 
+
+@cache_control(public=True, max_age=API_MAX_AGE)
+@condition(etag_func=get_product_list_etag)
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'ingridients': product.ingridients,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            },
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    _, payload = get_catalog_payload(request.catalog_version)
+    return HttpResponse(payload, content_type='application/json')
+
+
+def create_orders(validated_orders, geocode=True):
+    """
+    Saves orders validated by OrderSerializer, returns them in the same order.
+    Needs a couple of bulk_create calls where the database returns ids of inserted rows,
+    other databases get an INSERT per order.
+    Addresses are geocoded in the background after commit unless geocode is False.
+    """
+    orders = []
+    for order_fields in validated_orders:
+        orders.append(Order(
+            firstname=order_fields['firstname'],
+            lastname=order_fields['lastname'],
+            phonenumber=order_fields['phonenumber'],
+            address=order_fields['address'],
+            total_price=sum(fields['product'].price * fields['quantity'] for fields in order_fields['products']),
+            intake_token=order_fields.get('intake_token'),
+        ))
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        for order in orders:
+            order.save()
+
+    order_items = [
+        OrderItem(order=order, price=fields['product'].price, **fields)
+        for order, order_fields in zip(orders, validated_orders)
+        for fields in order_fields['products']
+    ]
+    OrderItem.objects.bulk_create(order_items)
+
+    refresh_order_candidates([order.id for order in orders])
+    if geocode:
+        geocode_in_background(*orders)
+    return orders
 
 
-@transaction.atomic
 @api_view(['POST'])
+@idempotent('register_order')
 def register_order(request):
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
+    order_fields = serializer.validated_data
+
+    customer = {
+        'firstname': order_fields['firstname'],
+        'lastname': order_fields['lastname'],
+        'phonenumber': order_fields['phonenumber'],
+        'address': order_fields['address'],
+    }
+    if settings.ORDER_INTAKE_QUEUE:
+        order_token = enqueue_order(order_fields)
+        return Response({'order_token': order_token, **customer}, status=status.HTTP_202_ACCEPTED)
+
+    with transaction.atomic():
+        order, = create_orders([order_fields])
+
+    return Response({'order_id': order.id, **customer})
+
+
+@api_view(['GET'])
+def order_intake_status(request, order_token):
+    intake_status = get_intake_status(order_token)
+    if not intake_status:
+        raise NotFound()
+    return Response(intake_status)
+
+
+def get_batch_product_ids(orders_data):
+    product_ids = set()
+    for order_data in orders_data:
+        products_fields = order_data.get('products') if isinstance(order_data, dict) else None
+        if not isinstance(products_fields, list):
+            continue
+        for fields in products_fields:
+            try:
+                product_ids.add(int(fields['product']))
+            except (TypeError, KeyError, ValueError):
+                # OrderSerializer reports what is wrong with the product
+                continue
+    return product_ids
 
-    order = Order.objects.create(
-        firstname=serializer.validated_data['firstname'],
-        lastname=serializer.validated_data['lastname'],
-        phonenumber=serializer.validated_data['phonenumber'],
-        address=serializer.validated_data['address'],
-    )
-
-    products_fields = serializer.validated_data['products']
-    if products_fields:
-        products = [OrderItem(order=order, price=fields.get('product').price, **fields) for fields in products_fields]
-        OrderItem.objects.bulk_create(products)
-    else:
-        raise IntegrityError('Order must have at least one product')
-
-    return Response({
-        'order_id': order.id,
-        'firstname': order.firstname,
-        'lastname': order.lastname,
-        'phonenumber': order.phonenumber,
-        'address': order.address,
-    })
+
+@transaction.atomic
+@api_view(['POST'])
+def register_orders_batch(request):
+    """
+    Takes {"orders": [order, ...]} with orders in the register_order format.
+    Every order is validated on its own, valid ones are saved even if others are not.
+    Returns {"orders": [{"order_id": id} or {"errors": {...}}, ...]} in the same order.
+    """
+    orders_data = request.data.get('orders') if isinstance(request.data, dict) else None
+    if not isinstance(orders_data, list) or not orders_data:
+        raise ValidationError({'orders': ['Ожидается непустой список заказов.']})
+    if len(orders_data) > ORDERS_BATCH_MAX_SIZE:
+        raise ValidationError({'orders': [f'Не больше {ORDERS_BATCH_MAX_SIZE} заказов за раз.']})
+
+    products = Product.objects.only('price').in_bulk(get_batch_product_ids(orders_data))
+
+    results = []
+    validated_orders = []
+    for order_data in orders_data:
+        serializer = OrderSerializer(data=order_data, context={'products': products})
+        if serializer.is_valid():
+            validated_orders.append(serializer.validated_data)
+            results.append(None)
+        else:
+            results.append({'errors': serializer.errors})
+
+    created_orders = iter(create_orders(validated_orders)) if validated_orders else iter([])
+    results = [result or {'order_id': next(created_orders).id} for result in results]
+
+    return Response({'orders': results})
@@ -1,3 +1,47 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
 
-# Create your tests here.
+from foodcartapp.benchmark import BenchmarkTestCase, DATA_SIZES, measure
+
+
+# Query budgets do not depend on the data size, time budgets are generous
+# to survive slow CI machines but still catch O(n) queries and O(n²) loops.
+# Memory tracing slows rendering down a few times, budgets account for that.
+VIEW_ORDERS_QUERIES = 5
+VIEW_ORDERS_WALL_TIME = 2
+VIEW_ORDERS_PEAK_MEMORY = 20 * 1024 * 1024
+VIEW_PRODUCTS_QUERIES = 5
+VIEW_PRODUCTS_WALL_TIME = {'small': 0.5, 'medium': 2, 'large': 5}
+VIEW_PRODUCTS_PEAK_MEMORY = {'small': 5 * 1024 * 1024, 'medium': 8 * 1024 * 1024, 'large': 32 * 1024 * 1024}
+
+
+class ManagerPagesBenchmark(BenchmarkTestCase):
+    def setUp(self):
+        super().setUp()
+        manager = User.objects.create_user('manager', password='manager', is_staff=True)
+        self.client.force_login(manager)
+
+    def test_view_orders(self):
+        for size in DATA_SIZES:
+            with self.data_of_size(size):
+                with measure() as measurement:
+                    response = self.client.get('/manager/orders/')
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget(
+                    measurement,
+                    queries=VIEW_ORDERS_QUERIES,
+                    wall_time=VIEW_ORDERS_WALL_TIME,
+                    peak_memory=VIEW_ORDERS_PEAK_MEMORY,
+                )
+
+    def test_view_products(self):
+        for size in DATA_SIZES:
+            with self.data_of_size(size):
+                with measure() as measurement:
+                    response = self.client.get('/manager/products/')
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget(
+                    measurement,
+                    queries=VIEW_PRODUCTS_QUERIES,
+                    wall_time=VIEW_PRODUCTS_WALL_TIME[size],
+                    peak_memory=VIEW_PRODUCTS_PEAK_MEMORY[size],
+                )
@@ -14,6 +14,8 @@ urlpatterns = [
 
     path('orders/', views.view_orders, name="view_orders"),
 
+    path('metrics/', views.view_metrics, name="view_metrics"),
+
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
 ]
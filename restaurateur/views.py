@@ -1,5 +1,7 @@
 from django import forms
-from django.db.models import Sum
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.views import View
 from django.urls import reverse_lazy
@@ -9,6 +11,9 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 
 
+from foodcartapp.candidates import get_orders_candidates
+from foodcartapp.capabilities import capability_index
+from foodcartapp.metrics import get_counters
 from foodcartapp.models import Product, Restaurant, Order
 
 
@@ -29,6 +34,34 @@ class Login(forms.Form):
     )
 
 
+class OrdersFilter(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус', required=False,
+        choices=(('', 'Все'), *Order.STATUSES),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    payment_type = forms.ChoiceField(
+        label='Способ оплаты', required=False,
+        choices=(('', 'Все'), *Order.PAYMENT_TYPES),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    page_size = forms.IntegerField(
+        label='Заказов на странице', required=False, min_value=1, max_value=100,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    after = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_after(self):
+        after = self.cleaned_data['after']
+        if not after:
+            return None
+        registered_at, _, order_id = after.rpartition(',')
+        registered_at = parse_datetime(registered_at)
+        if not registered_at or not order_id.isdigit():
+            raise forms.ValidationError('Некорректный курсор страницы')
+        return registered_at, int(order_id)
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -60,6 +93,9 @@ class LogoutView(auth_views.LogoutView):
     next_page = reverse_lazy('restaurateur:login')
 
 
+ORDERS_PAGE_SIZE = 50
+
+
 def is_manager(user):
     return user.is_staff  # FIXME replace with specific permission
 
@@ -67,21 +103,14 @@ def is_manager(user):
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
-
-    default_availability = {restaurant.id: False for restaurant in restaurants}
-    products_with_restaurants = []
-    for product in products:
+    products = list(Product.objects.select_related('category'))
 
-        availability = {
-            **default_availability,
-            **{item.restaurant_id: item.availability for item in product.menu_items.all()},
-        }
-        orderer_availability = [availability[restaurant.id] for restaurant in restaurants]
-
-        products_with_restaurants.append(
-            (product, orderer_availability)
-        )
+    # menus come from the capability index, patched on every menu change, instead of a menu item per cell
+    availability_matrix = capability_index.get_availability_matrix(
+        [product.id for product in products],
+        [restaurant.id for restaurant in restaurants],
+    )
+    products_with_restaurants = [(product, availability_matrix[product.id]) for product in products]
 
     return render(request, template_name="products_list.html", context={
         'products_with_restaurants': products_with_restaurants,
@@ -98,7 +127,45 @@ def view_restaurants(request):
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders = Order.objects.annotate(total_price=Sum('order_items__price')).order_by('-id').prefetch_related('order_items__product__menu_items__restaurant')
+    filter_data = request.GET.copy()
+    filter_data.setdefault('status', 'unprocessed')
+    orders_filter = OrdersFilter(filter_data)
+    orders_filter.is_valid()
+    filters = {
+        field: orders_filter.cleaned_data.get(field)
+        for field in ['status', 'payment_type', 'page_size', 'after']
+    }
+
+    orders = Order.objects.order_by('-registered_at', '-id')
+    if filters['status']:
+        orders = orders.filter(status=filters['status'])
+    if filters['payment_type']:
+        orders = orders.filter(payment_type=filters['payment_type'])
+    if filters['after']:
+        registered_at, order_id = filters['after']
+        orders = orders.filter(Q(registered_at__lt=registered_at) | Q(registered_at=registered_at, id__lt=order_id))
+
+    page_size = filters['page_size'] or ORDERS_PAGE_SIZE
+    orders = list(orders[:page_size + 1])
+    has_next_page, orders = len(orders) > page_size, orders[:page_size]
+
+    next_page_query = None
+    if has_next_page:
+        next_page_data = filter_data.copy()
+        next_page_data['after'] = f'{orders[-1].registered_at.isoformat()},{orders[-1].id}'
+        next_page_query = next_page_data.urlencode()
+
+    orders_candidates = get_orders_candidates([order.id for order in orders])
+
+    orders_with_restaurants = [(order, orders_candidates[order.id]) for order in orders]
     return render(request, template_name='order_items.html', context={
-        'orders': orders
+        'orders_with_restaurants': orders_with_restaurants,
+        'orders_filter': orders_filter,
+        'next_page_query': next_page_query,
     })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_metrics(request):
+    """Counters of the worker process that answered, e.g. geocode.deduped against geocode.lookups."""
+    return JsonResponse(get_counters())